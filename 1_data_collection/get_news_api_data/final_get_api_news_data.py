@@ -4,9 +4,15 @@ This script calls a news api to get news articles based on the names of entities
 
 import csv
 import os
+import random
+import threading
+import time
 import requests
 import io
 import json
+import argparse
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from google.cloud import storage
 from dotenv import load_dotenv
 
@@ -15,6 +21,22 @@ load_dotenv()
 
 # News API Configurations
 NEWS_API_KEY = os.getenv("NEWS_API_KEY")
+NEWS_API_URL = "http://eventregistry.org/api/v1/article/getArticles"
+
+# Fetch engine configurations
+MAX_WORKERS = int(os.getenv("NEWS_API_MAX_WORKERS", "8"))  # Concurrent requests in flight
+REQUESTS_PER_SECOND = float(os.getenv("NEWS_API_REQUESTS_PER_SECOND", "5"))  # Token bucket refill rate
+MAX_RETRIES = int(os.getenv("NEWS_API_MAX_RETRIES", "5"))  # Retries on 429 / 5xx / connection errors
+RATE_LIMIT_PAUSE_SECONDS = float(os.getenv("NEWS_API_RATE_LIMIT_PAUSE_SECONDS", "60"))  # Pause after a 401
+MAX_RATE_LIMIT_PAUSES = int(os.getenv("NEWS_API_MAX_RATE_LIMIT_PAUSES", "5"))
+
+# Harvest configurations
+HARVEST_PREFIX = "michelin_news_data/harvest"
+ARTICLES_PER_PAGE = 100  # Maximum page size allowed by Event Registry
+CHUNK_SIZE = int(os.getenv("NEWS_HARVEST_CHUNK_SIZE", "500"))  # Articles per NDJSON chunk uploaded to GCS
+MAX_PAGES = int(os.getenv("NEWS_HARVEST_MAX_PAGES", "0"))  # 0 walks every page
+WATERMARKS_PATH = f"{HARVEST_PREFIX}/watermarks.json"  # Newest article already ingested per restaurant
+CANONICAL_NAMES_PATH = "restaurant_names/canonical_restaurants.csv"  # Deduplicated query list
 
 # Google Cloud Storage Configurations
 PROJECT_ID = os.getenv("PROJECT_ID")
@@ -34,15 +56,65 @@ def read_restaurant_names_from_gcs(file_path):
 class RateLimitException(Exception):
     pass
 
-def fetch_articles(restaurant_name):
-    url = "http://eventregistry.org/api/v1/article/getArticles"
+
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by all fetch workers.
+    Every request takes one token; tokens refill at `rate` per second up to `capacity`.
+    Calling pause() blocks every worker until the pause has elapsed.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def pause(self, seconds):
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                else:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def backoff_delay(attempt, retry_after=None):
+    """Exponential backoff with jitter, honouring a Retry-After header when the API sends one."""
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    return min(60, 2 ** attempt) + random.uniform(0, 1)
+
+
+def fetch_articles_page(restaurant_name, page=1, limiter=None, date_start=None):
+    """
+    Fetches one page of articles for a restaurant, optionally only those published from date_start.
+    Returns (articles, total_pages), or (None, 0) if the page could not be retrieved.
+    """
     headers = {"Content-Type": "application/json"}
     payload = {
         "action": "getArticles",
         "keyword": [restaurant_name, "suppliers", "restaurant"],
         "keywordOper": "and",
-        "articlesPage": 1,
-        "articlesCount": 100,
+        "articlesPage": page,
+        "articlesCount": ARTICLES_PER_PAGE,
         "articlesSortBy": "date",
         "articlesSortByAsc": False,
         "resultType": "articles",
@@ -51,69 +123,221 @@ def fetch_articles(restaurant_name):
         "includeArticleTitle": True,
         "includeArticleBody": True
     }
+    if date_start:
+        payload["dateStart"] = date_start[:10]  # The API filters on YYYY-MM-DD
 
-    response = requests.post(url, json=payload, headers=headers)
-    if response.status_code == 200:
-        return response.json().get('articles', {}).get('results', [])
-    elif response.status_code == 401:
-        raise RateLimitException("API rate limit reached. Halting process to save progress.")
-    else:
-        print(f"Failed to retrieve articles for {restaurant_name}. Status code: {response.status_code}")
-        return []
+    for attempt in range(MAX_RETRIES + 1):
+        if limiter:
+            limiter.acquire()
+        try:
+            response = requests.post(NEWS_API_URL, json=payload, headers=headers, timeout=60)
+        except requests.RequestException as e:
+            print(f"Request error for {restaurant_name}: {e}")
+            time.sleep(backoff_delay(attempt))
+            continue
 
-# Function to save JSON data to Google Cloud Storage
-def save_json_to_cloud_storage(data, file_name):
-    data_str = json.dumps(data, indent=2)
-    blob = bucket.blob(f"michelin_news_data/{file_name}")
-    blob.upload_from_string(data_str, content_type='application/json')
-    print(f"JSON data saved to {BUCKET_NAME}/michelin_news_data/{file_name}")
+        if response.status_code == 200:
+            articles = response.json().get('articles', {})
+            return articles.get('results', []), articles.get('pages', 0)
+        elif response.status_code == 401:
+            raise RateLimitException("API rate limit reached. Halting process to save progress.")
+        elif response.status_code == 429 or response.status_code >= 500:
+            delay = backoff_delay(attempt, response.headers.get("Retry-After"))
+            print(f"Status {response.status_code} for {restaurant_name}, retrying in {delay:.1f}s...")
+            time.sleep(delay)
+        else:
+            print(f"Failed to retrieve articles for {restaurant_name}. Status code: {response.status_code}")
+            return None, 0
 
+    print(f"Giving up on {restaurant_name} after {MAX_RETRIES} retries.")
+    return None, 0
 
-def main():
-    try:
+
+def article_date(article):
+    return article.get("dateTime") or article.get("date") or ""
+
+
+def load_watermarks():
+    blob = bucket.blob(WATERMARKS_PATH)
+    if not blob.exists():
+        return {}
+    return json.loads(blob.download_as_text(encoding='utf-8'))
+
+
+def update_watermarks(watermarks, checkpoint):
+    """
+    Advances the watermark of every restaurant whose harvest completed in this run and saves them to GCS.
+    """
+    for restaurant_name, state in checkpoint.items():
+        newest_date = state.get("newest_article_date")
+        if not state.get("complete") or not newest_date:
+            continue
+        if newest_date > watermarks.get(restaurant_name, {}).get("date", ""):
+            watermarks[restaurant_name] = {"date": newest_date, "uri": state.get("newest_article_uri")}
+    blob = bucket.blob(WATERMARKS_PATH)
+    blob.upload_from_string(json.dumps(watermarks, indent=2), content_type='application/json')
+    print(f"Watermarks saved to {BUCKET_NAME}/{WATERMARKS_PATH}")
+
+
+def fetch_with_resume(limiter, fetch, *args):
+    """
+    Calls fetch(*args) so that a 401 pauses every worker and then resumes.
+    Only gives up (re-raising RateLimitException) once the pause budget is used.
+    """
+    for pause in range(MAX_RATE_LIMIT_PAUSES + 1):
+        try:
+            return fetch(*args)
+        except RateLimitException:
+            if pause == MAX_RATE_LIMIT_PAUSES:
+                raise
+            print(f"Rate limit hit, pausing for {RATE_LIMIT_PAUSE_SECONDS}s...")
+            limiter.pause(RATE_LIMIT_PAUSE_SECONDS)
+
+
+class HarvestWriter:
+    """
+    Buffers harvested articles and streams them to GCS as numbered NDJSON chunks.
+    The per-restaurant checkpoint is uploaded straight after each chunk,
+    so it never points past articles that have not been saved.
+    """
+
+    def __init__(self, run_prefix, chunk_size=CHUNK_SIZE):
+        self.run_prefix = run_prefix
+        self.chunk_size = chunk_size
+        self.lock = threading.Lock()
+        self.buffer = []
+        self.checkpoint = self.load_checkpoint()
+        # Continue numbering after any chunks written by a previous, interrupted run
+        self.part = len(list(storage_client.list_blobs(bucket, prefix=f"{run_prefix}/part-")))
+
+    def load_checkpoint(self):
+        blob = bucket.blob(f"{self.run_prefix}/checkpoint.json")
+        if not blob.exists():
+            return {}
+        return json.loads(blob.download_as_text(encoding='utf-8'))
+
+    def add_page(self, restaurant_name, page, articles, complete):
+        lines = [json.dumps({"url": article["url"], "text": article["body"], "relationships": []})
+                 for article in articles]
+        with self.lock:
+            self.buffer.extend(lines)
+            state = self.checkpoint.setdefault(
+                restaurant_name, {"last_page": 0, "last_article_date": None, "complete": False})
+            state["last_page"] = page
+            if articles:
+                state["last_article_date"] = article_date(articles[-1])
+                if page == 1:
+                    # Results are sorted newest first, so this becomes the next watermark
+                    state["newest_article_date"] = article_date(articles[0])
+                    state["newest_article_uri"] = articles[0].get("uri")
+            state["complete"] = complete
+            if len(self.buffer) >= self.chunk_size:
+                self._flush()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        if self.buffer:
+            self.part += 1
+            blob = bucket.blob(f"{self.run_prefix}/part-{self.part:05d}.ndjson")
+            blob.upload_from_string("\n".join(self.buffer) + "\n", content_type='application/x-ndjson')
+            self.buffer = []
+        blob = bucket.blob(f"{self.run_prefix}/checkpoint.json")
+        blob.upload_from_string(json.dumps(self.checkpoint, indent=2), content_type='application/json')
+
+
+def harvest_restaurant(restaurant_name, limiter, writer, watermark=None):
+    """
+    Walks every page of results for one restaurant, starting after its last checkpointed page.
+    With a watermark, only articles newer than it are kept and paging stops once it is reached.
+    Returns the number of articles harvested in this run.
+    """
+    state = writer.checkpoint.get(restaurant_name, {})
+    if state.get("complete"):
+        return 0
+
+    page = state.get("last_page", 0) + 1
+    harvested = 0
+    while True:
+        date_start = watermark["date"] if watermark else None
+        articles, pages = fetch_with_resume(limiter, fetch_articles_page, restaurant_name, page, limiter, date_start)
+        if articles is None:
+            return harvested  # Leave the checkpoint where it is so the next run retries this page
+        last_page = min(pages, MAX_PAGES) if MAX_PAGES else pages
+        complete = page >= last_page
+        if watermark:
+            new_articles = [article for article in articles if article_date(article) > watermark["date"]]
+            complete = complete or len(new_articles) < len(articles)
+            articles = new_articles
+        writer.add_page(restaurant_name, page, articles, complete)
+        harvested += len(articles)
+        if complete:
+            return harvested
+        page += 1
+
+
+def harvest_all_articles(restaurant_names, writer, watermarks=None, max_workers=MAX_WORKERS,
+                         requests_per_second=REQUESTS_PER_SECOND):
+    """
+    Harvests articles for all restaurant names concurrently.
+    Passing watermarks switches to incremental mode, where only newer articles are harvested.
+    Yields (restaurant_name, harvested_count) tuples as each restaurant completes.
+    """
+    watermarks = watermarks or {}
+    limiter = TokenBucket(requests_per_second)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(harvest_restaurant, name, limiter, writer, watermarks.get(name)): name
+                   for name in restaurant_names}
+        try:
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+        except BaseException:
+            # Do not start any queued requests once we are stopping
+            for future in futures:
+                future.cancel()
+            raise
+
+
+def main(run_id, incremental=False):
+    if bucket.blob(CANONICAL_NAMES_PATH).exists():
+        # Built by canonicalize_restaurant_names.py, with each restaurant listed once across all name lists
+        all_restaurant_names = read_restaurant_names_from_gcs(CANONICAL_NAMES_PATH)
+    else:
+        print(f"{CANONICAL_NAMES_PATH} not found, run canonicalize_restaurant_names.py to merge name variants.")
         michelin_restaurants_path = "restaurant_names/michelin_restaurants.csv"
         green_michelin_restaurants_path = "restaurant_names/green_michelin_restaurants.csv"
 
         restaurant_names = read_restaurant_names_from_gcs(michelin_restaurants_path)
         green_restaurant_names = read_restaurant_names_from_gcs(green_michelin_restaurants_path)
+        # Restaurants on both lists are only queried once
+        all_restaurant_names = list(dict.fromkeys(green_restaurant_names + restaurant_names))
 
-        all_articles_data = []
-
-        for idx, name in enumerate(green_restaurant_names, 1):
-            print(f"Fetching articles for {name}...")
-            articles = fetch_articles(name)
-            for article in articles:
-                # Extract and store the required information from each article
-                article_data = {
-                    "url": article["url"],
-                    "text": article["body"],
-                    "relationships": []
-                }
-                all_articles_data.append(article_data)
-
-        # Repeat for other file
-        for idx, name in enumerate(restaurant_names, 1):
-            print(f"Fetching articles for {name}...")
-            articles = fetch_articles(name)
-            for article in articles:
-                article_data = {
-                    "url": article["url"],
-                    "text": article["body"],
-                    "relationships": []
-                }
-                all_articles_data.append(article_data)
-
+    run_prefix = f"{HARVEST_PREFIX}/{run_id}"
+    writer = HarvestWriter(run_prefix)
+    watermarks = load_watermarks()
+    try:
+        for name, harvested in harvest_all_articles(all_restaurant_names, writer,
+                                                    watermarks if incremental else None):
+            print(f"Harvested {harvested} articles for {name}")
     except RateLimitException as e:
         print(e)
-        # Save the progress made so far before halting the process
-        save_json_to_cloud_storage(all_articles_data, "supply_chain_news_data_partial.json")
+        print(f"Progress checkpointed. Re-run with --run_id {run_id} to resume.")
         return  # Stop the process
+    finally:
+        # Save whatever is buffered along with the checkpoint, even if the run crashed
+        writer.flush()
+        update_watermarks(watermarks, writer.checkpoint)
 
-    # Save the processed data to Google Cloud Storage
-    save_json_to_cloud_storage(all_articles_data, "supply_chain_news_data.json")
-    print(f"Processed {len(restaurant_names)} restaurant names.")
+    print(f"Articles saved as NDJSON chunks to {BUCKET_NAME}/{run_prefix}/")
+    print(f"Processed {len(all_restaurant_names)} restaurant names.")
 
 if __name__ == "__main__":
-    main()
-
-
+    parser = argparse.ArgumentParser(description='Harvest news articles for restaurant names into GCS.')
+    parser.add_argument('--run_id', type=str, default=datetime.now().strftime("%Y%m%d"),
+                        help='Harvest run to create or resume (defaults to today\'s date)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Only harvest articles newer than each restaurant\'s watermark')
+    args = parser.parse_args()
+    main(args.run_id, args.incremental)
@@ -0,0 +1,136 @@
+"""
+This script merges the restaurant name lists into one deduplicated list of names to query the news API with.
+Names are normalised (accents, case, punctuation, slug artefacts) so that the same restaurant scraped from several
+lists, or written slightly differently, is only queried once. Each output row records the lists the name came from.
+"""
+
+import csv
+import io
+import os
+import re
+import unicodedata
+from google.cloud import storage
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Google Cloud Storage Configurations
+PROJECT_ID = os.getenv("PROJECT_ID")
+BUCKET_NAME = os.getenv("BUCKET_NAME")
+
+# Initialize Google Cloud Storage Client
+storage_client = storage.Client()
+bucket = storage_client.bucket(BUCKET_NAME)
+
+# Name lists to merge, in the order names should be queried
+NAME_SOURCES = [
+    ("green_michelin", "restaurant_names/green_michelin_restaurants.csv"),
+    ("michelin", "restaurant_names/michelin_restaurants.csv"),
+    ("google_places", "restaurant_names/google_places_api_restaurants.csv"),
+]
+CANONICAL_NAMES_PATH = "restaurant_names/canonical_restaurants.csv"
+
+# Tokens that slugs and listings add or drop around the same name
+LEADING_TOKENS = {"the"}
+TRAILING_TOKENS = {"london"}
+
+
+def read_names_from_gcs(file_path):
+    blob = bucket.blob(file_path)
+    if not blob.exists():
+        print(f"Skipping {file_path}: not found in {BUCKET_NAME}")
+        return []
+    reader = csv.reader(io.StringIO(blob.download_as_text(encoding='utf-8')))
+    return [row[0].strip() for row in reader if row and row[0].strip()]
+
+
+def canonical_key(name):
+    """
+    Folds a restaurant name to the key used for deduplication.
+    "Jamie S", "jamie-s", "Jamie’s" and "JAMIE'S 1234567" all map to "jamies".
+    """
+    # Strip accents and case
+    key = unicodedata.normalize("NFKD", name)
+    key = "".join(char for char in key if not unicodedata.combining(char)).casefold()
+    key = key.replace("&", " and ")
+    # Scraped slugs carry numeric ids
+    key = re.sub(r'\d{5,}', ' ', key)
+    # Apostrophes join the possessive onto the word, other punctuation separates words
+    key = re.sub(r"['’`]", "", key)
+    key = re.sub(r'[^\w\s]|_', ' ', key)
+    tokens = key.split()
+
+    # A slug like "jamie-s" loses its apostrophe, so fold a lone "s" back onto the previous word
+    folded = []
+    for token in tokens:
+        if token == "s" and folded:
+            folded[-1] += "s"
+        else:
+            folded.append(token)
+
+    while len(folded) > 1 and folded[0] in LEADING_TOKENS:
+        folded.pop(0)
+    while len(folded) > 1 and folded[-1] in TRAILING_TOKENS:
+        folded.pop()
+    return " ".join(folded)
+
+
+def is_slug_derived(name):
+    # Names rebuilt from URL slugs are plain title case ASCII without punctuation
+    return name == name.title() and name.isascii() and not re.search(r"[^\w\s']", name)
+
+
+def canonicalize_names(sources):
+    """
+    Groups the names from every (source, names) pair by canonical key.
+    Returns a list of (display name, sources, variants) in first-seen order.
+    The display name prefers a variant with real casing or punctuation over one rebuilt from a slug.
+    """
+    groups = {}
+    for source, names in sources:
+        for name in names:
+            key = canonical_key(name)
+            if not key:
+                continue
+            group = groups.setdefault(key, {"variants": [], "sources": []})
+            if name not in group["variants"]:
+                group["variants"].append(name)
+            if source not in group["sources"]:
+                group["sources"].append(source)
+
+    canonical = []
+    for group in groups.values():
+        variants = group["variants"]
+        display_name = next((name for name in variants if not is_slug_derived(name)), variants[0])
+        canonical.append((display_name, group["sources"], variants))
+    return canonical
+
+
+def save_to_cloud_storage_csv(rows, file_name):
+    # Rows are name, sources, variants - with no header, so readers taking row[0] get the query names
+    output = io.StringIO()
+    writer = csv.writer(output)
+
+    for display_name, sources, variants in rows:
+        writer.writerow([display_name, ";".join(sources), "|".join(variants)])
+
+    blob = bucket.blob(file_name)
+    blob.upload_from_string(output.getvalue(), content_type='text/csv')
+    print(f"Data saved to {BUCKET_NAME}/{file_name}")
+
+
+def main():
+    sources = [(source, read_names_from_gcs(path)) for source, path in NAME_SOURCES]
+    total_names = sum(len(names) for _, names in sources)
+
+    canonical = canonicalize_names(sources)
+    save_to_cloud_storage_csv(canonical, CANONICAL_NAMES_PATH)
+
+    on_several_lists = sum(1 for _, names_sources, _ in canonical if len(names_sources) > 1)
+    print(f"Merged {total_names} names into {len(canonical)} restaurants "
+          f"({on_several_lists} on more than one list), saving {total_names - len(canonical)} API queries.")
+
+
+if __name__ == "__main__":
+    main()
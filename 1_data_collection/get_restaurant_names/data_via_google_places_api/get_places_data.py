@@ -5,8 +5,11 @@ I switched strategy and decided getting restaurant names from the Michelin guide
 
 import time
 import os
+import math
+import argparse
 import requests
 import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from google.cloud import storage
 from dotenv import load_dotenv
 
@@ -17,6 +20,11 @@ load_dotenv()
 PLACES_API_KEY = os.getenv("PLACES_API_KEY")
 GOOGLE_APPLICATION_CREDENTIALS = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
 
+# Harvest configurations
+MAX_WORKERS = int(os.getenv("PLACES_MAX_WORKERS", "8"))  # Locations fetched concurrently
+SEARCH_RADIUS_METERS = 2000
+PAGE_TOKEN_RETRIES = 5  # A new page token takes a couple of seconds to become valid
+
 # Google Cloud Storage Configurations
 PROJECT_ID = os.getenv("PROJECT_ID")
 BUCKET_NAME = os.getenv("BUCKET_NAME")
@@ -33,13 +41,19 @@ def get_all_restaurants(location, keyword="restaurant"):
     params = {
         "key": PLACES_API_KEY,
         "location": location,
-        "radius": 2000,
+        "radius": SEARCH_RADIUS_METERS,
         "type": "restaurant",
         "keyword": keyword
     }
 
     while True:
-        response = requests.get(url, params=params).json()
+        response = requests.get(url, params=params, timeout=30).json()
+        # Each location follows its own page-token chain, retrying while the token is not yet valid
+        retries = 0
+        while response.get("status") == "INVALID_REQUEST" and 'pagetoken' in params and retries < PAGE_TOKEN_RETRIES:
+            time.sleep(2)
+            retries += 1
+            response = requests.get(url, params=params, timeout=30).json()
 
         filtered_data = []
         for restaurant in response.get("results", []):
@@ -79,13 +93,54 @@ locations = [
     ("51.5074,-0.1103", "south_bank")
 ]
 
-def main():
-    for idx, (location, area_name) in enumerate(locations, start=1):
-        print(f"Fetching restaurants for {area_name}...")
-        restaurants_data = get_all_restaurants(location)
-        file_name = f"restaurants_data_{area_name}.json"
-        save_to_cloud_storage(restaurants_data, file_name)
-        print(f"Completed {idx} of {len(locations)} areas.")
+def city_grid(center, radius_km, spacing_km=None):
+    """
+    Covers a whole city with search locations on a square grid within radius_km of center.
+    The default spacing lets neighbouring search circles overlap so no gaps are left between them.
+    """
+    spacing_km = spacing_km or SEARCH_RADIUS_METERS / 1000 * math.sqrt(2)
+    lat, lng = (float(value) for value in center.split(","))
+    km_per_lat = 110.574
+    km_per_lng = 111.320 * math.cos(math.radians(lat))
+
+    steps = int(radius_km // spacing_km)
+    grid = []
+    for row in range(-steps, steps + 1):
+        for col in range(-steps, steps + 1):
+            if math.hypot(row * spacing_km, col * spacing_km) > radius_km:
+                continue
+            point = f"{lat + row * spacing_km / km_per_lat:.4f},{lng + col * spacing_km / km_per_lng:.4f}"
+            grid.append((point, f"grid_{row + steps:03d}_{col + steps:03d}"))
+    return grid
+
+
+def fetch_and_save(location, area_name):
+    restaurants_data = get_all_restaurants(location)
+    file_name = f"restaurants_data_{area_name}.json"
+    save_to_cloud_storage(restaurants_data, file_name)
+    return len(restaurants_data)
+
+
+def main(locations, max_workers=MAX_WORKERS):
+    # Locations are independent, so run time scales with concurrency rather than the number of locations
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(fetch_and_save, location, area_name): area_name
+                   for location, area_name in locations}
+        for idx, future in enumerate(as_completed(futures), start=1):
+            area_name = futures[future]
+            try:
+                print(f"Fetched {future.result()} restaurants for {area_name}.")
+            except Exception as e:
+                print(f"Failed to fetch restaurants for {area_name}: {e}")
+            print(f"Completed {idx} of {len(locations)} areas.")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description='Fetch restaurants from Google Places for a set of locations')
+    parser.add_argument('--city_center', type=str, default=None,
+                        help='Search a grid over a whole city centred here ("lat,lng") instead of the listed areas')
+    parser.add_argument('--city_radius_km', type=float, default=10.0, help='Radius of the city grid')
+    parser.add_argument('--max_workers', type=int, default=MAX_WORKERS, help='Locations fetched concurrently')
+    args = parser.parse_args()
+
+    search_locations = city_grid(args.city_center, args.city_radius_km) if args.city_center else locations
+    main(search_locations, args.max_workers)
@@ -7,6 +7,7 @@ import os
 import io
 import csv
 import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from google.cloud import storage
 from dotenv import load_dotenv
 
@@ -22,23 +23,28 @@ storage_client = storage.Client()
 bucket = storage_client.bucket(BUCKET_NAME)
 
 PREFIX = "wip_supply_chain_progress/restaurants/restaurants_data_"
+MAX_WORKERS = int(os.getenv("PLACES_MAX_WORKERS", "8"))  # Blobs downloaded concurrently
 
 
-def list_unique_restaurant_names():
+def read_restaurant_names(blob):
+    # Deserialize the blob back into Python objects (dicts and lists) and keep only the names
+    with blob.open("r", encoding="utf-8") as f:
+        data = json.load(f)
+    return {restaurant.get('name', '') for restaurant in data}
+
+
+def list_unique_restaurant_names(max_workers=MAX_WORKERS):
     # List all files in the specified directory/prefix
     blobs = storage_client.list_blobs(bucket, prefix=PREFIX)
     unique_names = set()
 
-    for blob in blobs:
-        # Download the blob to a bytes object
-        blob_data = blob.download_as_bytes()
-        # Deserialize the bytes object back into Python objects (dicts and lists)
-        data = json.loads(blob_data)
-
-        # Extract and process the name of each restaurant
-        for restaurant in data:
-            name = restaurant.get('name', '')
-            unique_names.add(name)
+    # Download and parse the blobs in parallel, merging each one's names as soon as it is ready
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(read_restaurant_names, blob) for blob in blobs]
+        for future in as_completed(futures):
+            unique_names.update(future.result())
+    unique_names.discard('')
+    print(f"Found {len(unique_names)} unique restaurant names in {len(futures)} files")
 
     # Now, unique_names contains all unique base names of restaurants
     # Save these names to a CSV file in GCS
@@ -2,62 +2,16 @@
 This script extracts the names of Michelin Restaurants using scraping as the data retrieval method.
 """
 
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from webdriver_manager.chrome import ChromeDriverManager
+import argparse
 import csv
-import re
-import time
 import io
 import os
 from google.cloud import storage
 from dotenv import load_dotenv
+from michelin_scraper import scrape_restaurant_names
 
-
-# Create a ChromeOptions object and add the headless argument
-chrome_options = Options()
-chrome_options.add_argument("--headless")
-
-# Setup WebDriver with headless option
-driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=chrome_options)
-
-# List of URLs to scrape
-urls = [
-    'https://guide.michelin.com/se/en/greater-london/london/restaurants/all-starred?sort=distance',
-    'https://guide.michelin.com/se/en/greater-london/london/restaurants/all-starred/page/2?sort=distance',
-    'https://guide.michelin.com/se/en/greater-london/london/restaurants/all-starred/page/3?sort=distance',
-    'https://guide.michelin.com/se/en/greater-london/london/restaurants/all-starred/page/4?sort=distance',
-]
-
-restaurants = []
-
-for url in urls:
-    driver.get(url)
-    time.sleep(5)  # Wait for page to load and JavaScript to render the content
-
-    # Click the "Agree and close" button on the cookie consent dialog
-    try:
-        consent_button = driver.find_element(By.ID, "didomi-notice-agree-button")
-        consent_button.click()
-        time.sleep(2)  # Wait a bit for the dialog to close and the page to update
-    except Exception as e:
-        print("Consent dialog handling error:", e)
-
-    # Extract the restaurant names
-    restaurant_divs = driver.find_elements(By.CSS_SELECTOR, 'div.col-md-6.col-lg-4.col-xl-3 a.link')
-    for div in restaurant_divs:
-        href = div.get_attribute('href')
-        if href and 'restaurant' in href:
-            restaurant_name = href.split('/')[-1].replace('-', ' ').title()
-            if restaurant_name.endswith(" S"):
-                restaurant_name = restaurant_name[:-2] + "'s"
-
-            restaurant_name = re.sub(r'\d{5,}', '', restaurant_name).strip()
-            restaurants.append(restaurant_name)
-
-driver.quit()
+# First page of the listing - the remaining pages are discovered from its pagination links
+BASE_URL = 'https://guide.michelin.com/se/en/greater-london/london/restaurants/all-starred?sort=distance'
 
 
 # Save that into GCS
@@ -87,8 +41,18 @@ def save_to_cloud_storage_csv(data, file_name):
     print(f"Data saved to {BUCKET_NAME}/restaurant_names/{file_name}")
 
 
-# Call the function to save your data to GCS
-save_to_cloud_storage_csv(restaurants, 'michelin_restaurants.csv')
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Scrape Michelin starred restaurant names in London')
+    parser.add_argument('--backend', choices=['http', 'selenium'], default='http',
+                        help='Plain HTTP with Selenium as fallback, or Selenium only')
+    parser.add_argument('--max_workers', type=int, default=4, help='Pages fetched concurrently by the HTTP backend')
+    parser.add_argument('--html_dir', type=str, default=None, help='Parse saved page_<N>.html files instead of fetching')
+    parser.add_argument('--save_html_dir', type=str, default=None, help='Save fetched pages as page_<N>.html files')
+    args = parser.parse_args()
+
+    restaurants = scrape_restaurant_names(BASE_URL, args.backend, args.max_workers, args.html_dir, args.save_html_dir)
 
-print("Data saved to 'michelin_restaurants.csv'")
+    # Call the function to save your data to GCS
+    save_to_cloud_storage_csv(restaurants, 'michelin_restaurants.csv')
 
+    print("Data saved to 'michelin_restaurants.csv'")
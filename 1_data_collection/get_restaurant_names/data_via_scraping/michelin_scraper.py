@@ -0,0 +1,205 @@
+"""
+Shared scraping backends for the Michelin guide listing pages.
+The HTTP backend fetches listing pages concurrently and parses them with the standard library HTML parser,
+so no browser is needed. The Selenium backend drives headless Chrome and is only used as a fallback.
+Listings can also be parsed offline from saved HTML files.
+"""
+
+import glob
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlsplit, urlunsplit
+
+import requests
+
+# Restaurant cards are `div.col-md-6.col-lg-4.col-xl-3 a.link` in the listing grid
+CARD_CLASSES = {"col-md-6", "col-lg-4", "col-xl-3"}
+LINK_CLASS = "link"
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+PAGE_PATTERN = re.compile(r'/page/(\d+)')
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                  "(KHTML, like Gecko) Chrome/124.0 Safari/537.36",
+    "Accept-Language": "en-GB,en;q=0.9",
+}
+
+
+class ListingParser(HTMLParser):
+    """Collects restaurant card links and the highest page number linked from a listing page."""
+
+    def __init__(self, base_url):
+        super().__init__()
+        self.base_url = base_url
+        self.stack = []  # (tag, is card div) for every open element
+        self.card_depth = 0
+        self.hrefs = []
+        self.page_count = 1
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        classes = set((attrs.get("class") or "").split())
+        href = attrs.get("href")
+
+        if tag == "a" and href:
+            if self.card_depth and LINK_CLASS in classes:
+                self.hrefs.append(urljoin(self.base_url, href))
+            page = PAGE_PATTERN.search(href)
+            if page:
+                self.page_count = max(self.page_count, int(page.group(1)))
+
+        is_card = tag == "div" and CARD_CLASSES <= classes
+        self.card_depth += is_card
+        if tag not in VOID_TAGS:
+            self.stack.append((tag, is_card))
+
+    def handle_endtag(self, tag):
+        # Pop up to the matching tag, which also closes any elements left unclosed in the markup
+        for idx in range(len(self.stack) - 1, -1, -1):
+            if self.stack[idx][0] == tag:
+                for _, is_card in self.stack[idx:]:
+                    self.card_depth -= is_card
+                del self.stack[idx:]
+                break
+
+
+def parse_listing(html, base_url):
+    """Returns (restaurant hrefs, page count) for one listing page."""
+    parser = ListingParser(base_url)
+    parser.feed(html)
+    parser.close()
+    return parser.hrefs, parser.page_count
+
+
+def name_from_href(href):
+    # The restaurant name is rebuilt from the URL slug
+    restaurant_name = href.rstrip('/').split('/')[-1].split('?')[0].replace('-', ' ').title()
+    # Drop slug ids before fixing possessives, so "jamie-s-1234567" becomes "Jamie's"
+    restaurant_name = re.sub(r'\d{5,}', '', restaurant_name).strip()
+    if restaurant_name.endswith(" S"):
+        restaurant_name = restaurant_name[:-2] + "'s"
+    return restaurant_name
+
+
+def names_from_hrefs(hrefs):
+    return [name_from_href(href) for href in hrefs if href and 'restaurant' in href]
+
+
+def page_url(base_url, page):
+    # Page N of a listing lives at <path>/page/N with the same query string
+    if page == 1:
+        return base_url
+    parts = urlsplit(base_url)
+    path = PAGE_PATTERN.sub('', parts.path).rstrip('/')
+    return urlunsplit((parts.scheme, parts.netloc, f"{path}/page/{page}", parts.query, parts.fragment))
+
+
+def fetch_page(session, url, timeout=30):
+    response = session.get(url, headers=HEADERS, timeout=timeout)
+    response.raise_for_status()
+    return response.text
+
+
+def save_html(save_html_dir, page, html):
+    os.makedirs(save_html_dir, exist_ok=True)
+    with open(os.path.join(save_html_dir, f"page_{page}.html"), 'w', encoding='utf-8') as f:
+        f.write(html)
+
+
+def scrape_http(base_url, max_workers=4, save_html_dir=None):
+    """
+    Fetches page 1, reads the page count from its pagination links, then fetches the remaining pages concurrently.
+    Returns restaurant names in page order.
+    """
+    with requests.Session() as session:
+        first_page = fetch_page(session, base_url)
+        hrefs, page_count = parse_listing(first_page, base_url)
+        pages = {1: hrefs}
+        if save_html_dir:
+            save_html(save_html_dir, 1, first_page)
+
+        def fetch_and_parse(page):
+            url = page_url(base_url, page)
+            html = fetch_page(session, url)
+            if save_html_dir:
+                save_html(save_html_dir, page, html)
+            return page, parse_listing(html, url)[0]
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for page, page_hrefs in executor.map(fetch_and_parse, range(2, page_count + 1)):
+                pages[page] = page_hrefs
+
+    print(f"Fetched {page_count} pages from {base_url}")
+    return names_from_hrefs([href for page in sorted(pages) for href in pages[page]])
+
+
+def scrape_html_files(html_dir, base_url):
+    """Parses listing pages saved as page_<N>.html, for running the scraper offline."""
+    paths = glob.glob(os.path.join(html_dir, "page_*.html"))
+    paths.sort(key=lambda path: int(re.search(r'page_(\d+)\.html$', path).group(1)))
+    hrefs = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            hrefs.extend(parse_listing(f.read(), base_url)[0])
+    print(f"Parsed {len(paths)} saved pages from {html_dir}")
+    return names_from_hrefs(hrefs)
+
+
+def scrape_selenium(base_url):
+    """Scrapes every page with headless Chrome. Slow, but it renders pages the HTTP backend cannot."""
+    from selenium import webdriver
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.chrome.service import Service
+    from selenium.webdriver.chrome.options import Options
+    from webdriver_manager.chrome import ChromeDriverManager
+
+    # Create a ChromeOptions object and add the headless argument
+    chrome_options = Options()
+    chrome_options.add_argument("--headless")
+    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=chrome_options)
+
+    hrefs = []
+    page, page_count = 1, 1
+    try:
+        while page <= page_count:
+            driver.get(page_url(base_url, page))
+            time.sleep(5)  # Wait for page to load and JavaScript to render the content
+
+            # Click the "Agree and close" button on the cookie consent dialog
+            try:
+                consent_button = driver.find_element(By.ID, "didomi-notice-agree-button")
+                consent_button.click()
+                time.sleep(2)  # Wait a bit for the dialog to close and the page to update
+            except Exception as e:
+                print("Consent dialog handling error:", e)
+
+            page_hrefs, discovered = parse_listing(driver.page_source, driver.current_url)
+            hrefs.extend(page_hrefs)
+            page_count = max(page_count, discovered)
+            page += 1
+    finally:
+        driver.quit()
+
+    return names_from_hrefs(hrefs)
+
+
+def scrape_restaurant_names(base_url, backend="http", max_workers=4, html_dir=None, save_html_dir=None):
+    """
+    Scrapes restaurant names from every page of a Michelin guide listing.
+    backend is "http" or "selenium"; the HTTP backend falls back to Selenium if it is blocked or finds nothing.
+    """
+    if html_dir:
+        return scrape_html_files(html_dir, base_url)
+
+    if backend == "http":
+        try:
+            names = scrape_http(base_url, max_workers, save_html_dir)
+            if names:
+                return names
+            print("HTTP backend found no restaurants, falling back to Selenium")
+        except requests.RequestException as e:
+            print(f"HTTP backend failed ({e}), falling back to Selenium")
+
+    return scrape_selenium(base_url)
@@ -0,0 +1,334 @@
+"""
+This script benchmarks the two heavy KFP components offline, without paying for Event Registry or GPT-4 calls.
+fetch_and_store_articles runs against a local stub news server serving synthetic articles, and
+process_articles_component runs against a deterministic fake chat model. Both can be given latency and a failure rate.
+GCS is replaced by a local directory. Each corpus size runs in a fresh process so peak RSS is measured per size.
+Not fully offline: tiktoken.encoding_for_model downloads its encoding on first use, then reads it from its cache
+(set TIKTOKEN_CACHE_DIR to a warmed directory for machines without network access).
+"""
+
+# Import libraries
+import argparse
+import asyncio
+import json
+import math
+import multiprocessing
+import os
+import queue
+import random
+import re
+import resource
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ARTICLES_PER_RESTAURANT = 25
+SUPPLIERS = ["Natoora", "HG Walter", "Wiltshire Truffles", "Flourish Bakery", "La Sovrana", "Neal's Yard Dairy"]
+PRODUCTS = ["vegetables", "meat", "truffles", "bread", "mozzarella", "cheese"]
+
+
+## Local stand-in for Google Cloud Storage
+class LocalBlob:
+    def __init__(self, root, name):
+        self.name = name
+        self.path = os.path.join(root, name)
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def download_as_text(self, encoding='utf-8'):
+        with open(self.path, 'r', encoding=encoding) as f:
+            return f.read()
+
+    def upload_from_string(self, data, content_type=None):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write(data)
+
+
+class LocalBucket:
+    def __init__(self, root):
+        self.root = root
+
+    def blob(self, name):
+        return LocalBlob(self.root, name)
+
+
+class LocalStorageClient:
+    def __init__(self, root):
+        self.root = root
+
+    def bucket(self, bucket_name):
+        return LocalBucket(os.path.join(self.root, bucket_name))
+
+    def list_blobs(self, bucket, prefix=""):
+        names = []
+        for dirpath, _, filenames in os.walk(bucket.root):
+            for filename in filenames:
+                name = os.path.relpath(os.path.join(dirpath, filename), bucket.root)
+                if name.startswith(prefix):
+                    names.append(name)
+        return [LocalBlob(bucket.root, name) for name in sorted(names)]
+
+
+## Synthetic corpus and stub news server
+def synthetic_article(restaurant_name, index):
+    """Builds a deterministic article tagged with [article-<id>] so the fake model can track it."""
+    article_id = f"{restaurant_name.replace(' ', '_')}-{index}"
+    supplier = SUPPLIERS[index % len(SUPPLIERS)]
+    product = PRODUCTS[index % len(PRODUCTS)]
+    filler = " ".join(f"The kitchen team talked about seasonal menus and service number {n}." for n in range(20))
+    body = (f"[article-{article_id}] {restaurant_name} has announced its spring menu. {filler} "
+            f"{supplier} supplies {product} to {restaurant_name}. "
+            f"The head chef said the partnership with {supplier} had shaped the new dishes.")
+    return {
+        "uri": article_id,
+        "url": f"https://news.example.com/{article_id}",
+        "body": body,
+        "dateTime": f"2024-01-{1 + index % 28:02d}T12:00:00Z",
+    }
+
+
+def start_stub_news_server(latency, failure_rate, seed):
+    """Serves Event Registry style pages of synthetic articles, failing with 429/503 at failure_rate."""
+    rng = random.Random(seed)
+    stats = {"requests": 0, "failures": 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            time.sleep(latency)
+            with lock:
+                stats["requests"] += 1
+                fail = rng.random() < failure_rate
+                if fail:
+                    stats["failures"] += 1
+            if fail:
+                self.send_response(rng.choice([429, 503]))
+                self.send_header("Retry-After", "0")
+                self.end_headers()
+                return
+
+            page, count = payload["articlesPage"], payload["articlesCount"]
+            start = (page - 1) * count
+            results = [synthetic_article(payload["keyword"][0], idx)
+                       for idx in range(start, min(start + count, ARTICLES_PER_RESTAURANT))]
+            body = json.dumps({"articles": {"results": results, "page": page,
+                                            "pages": math.ceil(ARTICLES_PER_RESTAURANT / count)}}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, stats
+
+
+## Deterministic fake chat model
+def make_fake_chat_model(latency, failure_rate, seed):
+    """
+    Returns a ChatOpenAI replacement that answers after `latency` seconds with the relationships
+    stated in the synthetic articles, raising openai.RateLimitError at failure_rate.
+    Per-article first-call and last-response times are recorded in the returned stats.
+    """
+    import httpx
+    from openai import RateLimitError
+    from langchain_core.language_models.chat_models import BaseChatModel
+    from langchain_core.messages import AIMessage
+    from langchain_core.outputs import ChatGeneration, ChatResult
+
+    rng = random.Random(seed)
+    stats = {"calls": 0, "failures": 0, "timings": {}}
+    relationship_pattern = re.compile(r"([A-Z][\w' ]+?) supplies (\w+) to ([A-Z][\w' ]+?)\.")
+    article_pattern = re.compile(r"<< ARTICLE id: (a\d+) >>\s*(.*?)(?=<< ARTICLE id: a\d+ >>|<< OUTPUT>>)", re.DOTALL)
+
+    def relationships_in(text):
+        return [{"supplier": supplier, "buyer": buyer, "product": product, "location": "London"}
+                for supplier, product, buyer in relationship_pattern.findall(text)]
+
+    def respond(prompt):
+        articles = article_pattern.findall(prompt)
+        if articles:
+            return json.dumps({"articles": [{"id": article_id, "relationships": relationships_in(text)}
+                                            for article_id, text in articles]})
+        return json.dumps({"url": "", "text": "", "relationships": relationships_in(prompt)})
+
+    def call(messages):
+        prompt = "\n".join(str(message.content) for message in messages)
+        article_ids = re.findall(r"\[article-([^\]]+)\]", prompt)
+        started = time.monotonic()
+        for article_id in article_ids:
+            stats["timings"].setdefault(article_id, [started, None])
+        stats["calls"] += 1
+        if rng.random() < failure_rate:
+            stats["failures"] += 1
+            request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+            raise RateLimitError("Fake rate limit", response=httpx.Response(429, request=request), body=None)
+        return prompt, article_ids
+
+    def finish(prompt, article_ids):
+        finished = time.monotonic()
+        for article_id in article_ids:
+            stats["timings"][article_id][1] = finished
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=respond(prompt)))])
+
+    class FakeChatModel(BaseChatModel):
+        @property
+        def _llm_type(self):
+            return "fake-chat"
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+            prompt, article_ids = call(messages)
+            time.sleep(latency)
+            return finish(prompt, article_ids)
+
+        async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+            prompt, article_ids = call(messages)
+            await asyncio.sleep(latency)
+            return finish(prompt, article_ids)
+
+    return (lambda **kwargs: FakeChatModel()), stats
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+## One benchmark run
+def run_benchmark(corpus_size, args, results):
+    """Runs fetch then extraction for one corpus size. Called in a fresh process."""
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from google.cloud import storage
+    import langchain_openai
+    import kfp_pipeline
+
+    workdir = tempfile.mkdtemp(prefix="kfp_benchmark_")
+    storage.Client = lambda project=None: LocalStorageClient(workdir)
+    bucket = LocalStorageClient(workdir).bucket("benchmark")
+
+    n_restaurants = max(1, corpus_size // ARTICLES_PER_RESTAURANT)
+    restaurant_names = [f"Restaurant {idx}" for idx in range(n_restaurants)]
+    bucket.blob("restaurant_names/benchmark.csv").upload_from_string("\n".join(restaurant_names) + "\n")
+
+    server, api_stats = start_stub_news_server(args.api_latency, args.api_failure_rate, args.seed)
+    fetched_path = os.path.join(workdir, "fetched.jsonl")
+    start = time.monotonic()
+    kfp_pipeline.fetch_and_store_articles.python_func(
+        news_api_key="benchmark",
+        project_id="benchmark",
+        bucket_name="benchmark",
+        restaurants_csv_path="restaurant_names/benchmark.csv",
+        output_file_path=fetched_path,
+        max_workers=args.fetch_workers,
+        requests_per_second=args.requests_per_second,
+        harvest_run_id=f"benchmark_{corpus_size}",
+        news_api_url=f"http://127.0.0.1:{server.server_port}/api/v1/article/getArticles",
+    )
+    fetch_elapsed = time.monotonic() - start
+    server.shutdown()
+    with open(fetched_path) as f:
+        fetched = sum(1 for line in f if line.strip())
+
+    fake_model, llm_stats = make_fake_chat_model(args.llm_latency, args.llm_failure_rate, args.seed)
+    langchain_openai.ChatOpenAI = fake_model
+    processed_path = os.path.join(workdir, "processed.jsonl")
+    start = time.monotonic()
+    kfp_pipeline.process_articles_component.python_func(
+        input_json_path=fetched_path,
+        output_json_path=processed_path,
+        openai_api_key="benchmark",
+        bucket_name="benchmark",
+        project_id="benchmark",
+        output_folder="benchmark",
+        max_concurrency=args.max_concurrency,
+        tokens_per_minute=args.tokens_per_minute,
+        cache_prefix="",
+        pack_token_budget=args.pack_token_budget,
+    )
+    process_elapsed = time.monotonic() - start
+    with open(processed_path) as f:
+        processed = sum(1 for line in f if line.strip())
+
+    latencies = [end - begin for begin, end in llm_stats["timings"].values() if end is not None]
+    results.put({
+        "corpus_size": corpus_size,
+        "fetch_articles_per_sec": fetched / fetch_elapsed if fetch_elapsed else 0.0,
+        "fetch_retries": api_stats["failures"],
+        "process_articles_per_sec": processed / process_elapsed if process_elapsed else 0.0,
+        "p50_latency": percentile(latencies, 50),
+        "p99_latency": percentile(latencies, 99),
+        "llm_calls": llm_stats["calls"],
+        "llm_retries": llm_stats["failures"],
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    })
+
+
+def main(args):
+    context = multiprocessing.get_context("spawn")
+    rows = []
+    for corpus_size in args.sizes:
+        results = context.Queue()
+        process = context.Process(target=run_benchmark, args=(corpus_size, args, results))
+        process.start()
+        # Poll rather than block, so a run that crashes (import error, model failure) is reported instead of hanging
+        row = None
+        while row is None:
+            try:
+                row = results.get(timeout=5)
+            except queue.Empty:
+                if not process.is_alive():
+                    # The result may have been put just before the process exited
+                    try:
+                        row = results.get(timeout=1)
+                    except queue.Empty:
+                        pass
+                    break
+        process.join()
+        if row is None:
+            print(f"Benchmark run for {corpus_size} articles exited with code {process.exitcode} without results")
+            continue
+        rows.append(row)
+
+    header = (f"{'articles':>9} {'fetch/s':>9} {'fetch retries':>14} {'extract/s':>10} {'p50 s':>7} "
+              f"{'p99 s':>7} {'llm calls':>10} {'llm retries':>12} {'peak RSS MB':>12}")
+    print(header)
+    for row in rows:
+        print(f"{row['corpus_size']:>9} {row['fetch_articles_per_sec']:>9.1f} {row['fetch_retries']:>14} "
+              f"{row['process_articles_per_sec']:>10.1f} {row['p50_latency']:>7.2f} {row['p99_latency']:>7.2f} "
+              f"{row['llm_calls']:>10} {row['llm_retries']:>12} {row['peak_rss_mb']:>12.1f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(rows, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the fetch and extraction components offline')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 5000], help='Corpus sizes (articles) to benchmark')
+    parser.add_argument('--api_latency', type=float, default=0.05, help='Stub news API latency per request in seconds')
+    parser.add_argument('--api_failure_rate', type=float, default=0.02, help='Fraction of news API requests answered with 429/503')
+    parser.add_argument('--llm_latency', type=float, default=0.5, help='Fake chat model latency per call in seconds')
+    parser.add_argument('--llm_failure_rate', type=float, default=0.02, help='Fraction of model calls raising RateLimitError')
+    parser.add_argument('--fetch_workers', type=int, default=8, help='max_workers for fetch_and_store_articles')
+    parser.add_argument('--requests_per_second', type=float, default=50.0, help='News API token bucket rate')
+    parser.add_argument('--max_concurrency', type=int, default=8, help='max_concurrency for process_articles_component')
+    parser.add_argument('--tokens_per_minute', type=int, default=10_000_000, help='Token budget for process_articles_component')
+    parser.add_argument('--pack_token_budget', type=int, default=0, help='Enable packed extraction with this budget')
+    parser.add_argument('--seed', type=int, default=42, help='Seed for the fake failure patterns')
+    parser.add_argument('--output', type=str, default="", help='Optional path to save the results as JSON')
+    main(parser.parse_args())
+
+# To run this script - compare runs by changing one setting at a time
+# python 2_vertex_ai/benchmark_pipeline.py --sizes 100 1000 --max_concurrency 16
@@ -1,6 +1,8 @@
 """
 This script is responsible for Named Entity Recognition and Relations Extraction on the news articles.
-It uses VertexAI and KFP pipelines to execute the task. There are two components as part of the kfp pipeline.
+It uses VertexAI and KFP pipelines to execute the task. The kfp pipeline fetches the articles, de-duplicates and
+pre-filters them, then fans relationship extraction out over shards and merges the results.
+Articles are passed between components as JSONL (one article per line, optionally gzipped).
 """
 
 # Import necessary libraries
@@ -9,7 +11,8 @@ import os
 from datetime import datetime
 from google.cloud import aiplatform
 from kfp import compiler
-from kfp.dsl import component, InputPath, OutputPath, pipeline
+from kfp.dsl import component, InputPath, OutputPath, pipeline, Input, Artifact
+from typing import List
 import kfp.dsl as dsl
 from google.cloud import storage
 import json
@@ -32,6 +35,8 @@ NOTEBOOK = 'supply_chain_pipeline_notebook'
 TIMESTAMP = datetime.now().strftime("%Y%m%d%H%M%S")
 URI = f"gs://{BUCKET}/{DATANAME}"
 DIR = f"temp/{NOTEBOOK}"
+# ParallelFor parallelism has to be fixed when the pipeline is compiled, so it is set here rather than at run time
+EXTRACTION_PARALLELISM = int(os.getenv("EXTRACTION_PARALLELISM", "4"))
 
 # Ensure the directory exists
 os.makedirs(DIR, exist_ok=True)
@@ -61,12 +66,31 @@ def fetch_and_store_articles(
     project_id: str,
     bucket_name: str,
     restaurants_csv_path: str,
-    output_file_path: OutputPath("json")
+    output_file_path: OutputPath("jsonl"),
+    max_workers: int = 8,
+    requests_per_second: float = 5.0,
+    max_retries: int = 5,
+    rate_limit_pause_seconds: float = 60.0,
+    max_rate_limit_pauses: int = 5,
+    harvest_prefix: str = "api-news-data/harvest",
+    harvest_run_id: str = "",
+    chunk_size: int = 500,
+    max_pages: int = 0,
+    incremental: bool = False,
+    compress: bool = False,
+    news_api_url: str = "http://eventregistry.org/api/v1/article/getArticles",
 ):
     # Import libraries
     import csv
+    import gzip
     import json
+    import os
+    import random
+    import threading
+    import time
+    from datetime import datetime
     import requests
+    from concurrent.futures import ThreadPoolExecutor, as_completed
     from google.cloud import storage
     from io import StringIO
     storage_client = storage.Client(project=project_id)
@@ -80,16 +104,55 @@ def fetch_and_store_articles(
         # next(reader, None)  # Skip the header
         return [row[0] for row in reader]
 
+    # Components run in isolation, so the fetch engine from final_get_api_news_data.py is inlined here
+    class RateLimitException(Exception):
+        pass
 
-    restaurant_names = read_restaurant_names_gcs(bucket_name, restaurants_csv_path)
-    all_articles_data = []
+    class TokenBucket:
+        def __init__(self, rate, capacity=None):
+            self.rate = rate
+            self.capacity = capacity or max(1.0, rate)
+            self.tokens = self.capacity
+            self.updated = time.monotonic()
+            self.paused_until = 0.0
+            self.lock = threading.Lock()
+
+        def pause(self, seconds):
+            with self.lock:
+                self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+                self.tokens = 0
+
+        def acquire(self):
+            while True:
+                with self.lock:
+                    now = time.monotonic()
+                    if now < self.paused_until:
+                        wait = self.paused_until - now
+                    else:
+                        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                        self.updated = now
+                        if self.tokens >= 1:
+                            self.tokens -= 1
+                            return
+                        wait = (1 - self.tokens) / self.rate
+                time.sleep(wait)
 
-    for name in restaurant_names:
-        url = "http://eventregistry.org/api/v1/article/getArticles"
+    def backoff_delay(attempt, retry_after=None):
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        return min(60, 2 ** attempt) + random.uniform(0, 1)
+
+    def article_date(article):
+        return article.get("dateTime") or article.get("date") or ""
+
+    def fetch_articles_page(name, page, limiter, date_start=None):
         payload = {
             "keyword": [name, "suppliers", "restaurant"],
             "keywordOper": "and",
-            "articlesPage": 1,
+            "articlesPage": page,
             "articlesCount": 100,
             "articlesSortBy": "date",
             "articlesSortByAsc": False,
@@ -99,38 +162,472 @@ def fetch_and_store_articles(
             "includeArticleTitle": True,
             "includeArticleBody": True
         }
-        response = requests.post(url, json=payload)
-        if response.status_code == 200:
-            articles = response.json().get('articles', {}).get('results', [])
-            for article in articles:
-                article_data = {
-                    "url": article["url"],
-                    "text": article["body"],
-                    "relationships": []
-                }
-                all_articles_data.append(article_data)
+        if date_start:
+            payload["dateStart"] = date_start[:10]
+        for attempt in range(max_retries + 1):
+            limiter.acquire()
+            try:
+                response = requests.post(news_api_url, json=payload, timeout=60)
+            except requests.RequestException as e:
+                print(f"Request error for {name}: {e}")
+                time.sleep(backoff_delay(attempt))
+                continue
+            if response.status_code == 200:
+                articles = response.json().get('articles', {})
+                return articles.get('results', []), articles.get('pages', 0)
+            elif response.status_code == 401:
+                raise RateLimitException(f"API rate limit reached while fetching {name}")
+            elif response.status_code == 429 or response.status_code >= 500:
+                time.sleep(backoff_delay(attempt, response.headers.get("Retry-After")))
+            else:
+                print(f"Failed to retrieve articles for {name}. Status code: {response.status_code}")
+                return None, 0
+        return None, 0
+
+    def fetch_with_resume(limiter, fetch, *args):
+        for pause in range(max_rate_limit_pauses + 1):
+            try:
+                return fetch(*args)
+            except RateLimitException:
+                if pause == max_rate_limit_pauses:
+                    raise
+                print(f"Rate limit hit, pausing for {rate_limit_pause_seconds}s...")
+                limiter.pause(rate_limit_pause_seconds)
+
+    # NDJSON chunks and the per-restaurant checkpoint live under one run prefix in GCS,
+    # so re-running with the same harvest_run_id resumes instead of re-downloading
+    class HarvestWriter:
+        def __init__(self, run_prefix):
+            self.run_prefix = run_prefix
+            self.lock = threading.Lock()
+            self.buffer = []
+            blob = bucket.blob(f"{run_prefix}/checkpoint.json")
+            self.checkpoint = json.loads(blob.download_as_text()) if blob.exists() else {}
+            self.part = len(list(storage_client.list_blobs(bucket, prefix=f"{run_prefix}/part-")))
+
+        def add_page(self, name, page, articles, complete):
+            lines = [json.dumps({"url": article["url"], "text": article["body"], "relationships": []})
+                     for article in articles]
+            with self.lock:
+                self.buffer.extend(lines)
+                state = self.checkpoint.setdefault(
+                    name, {"last_page": 0, "last_article_date": None, "complete": False})
+                state["last_page"] = page
+                if articles:
+                    state["last_article_date"] = article_date(articles[-1])
+                    if page == 1:
+                        state["newest_article_date"] = article_date(articles[0])
+                        state["newest_article_uri"] = articles[0].get("uri")
+                state["complete"] = complete
+                if len(self.buffer) >= chunk_size:
+                    self._flush()
+
+        def flush(self):
+            with self.lock:
+                self._flush()
+
+        def _flush(self):
+            if self.buffer:
+                self.part += 1
+                blob = bucket.blob(f"{self.run_prefix}/part-{self.part:05d}.ndjson")
+                blob.upload_from_string("\n".join(self.buffer) + "\n", content_type='application/x-ndjson')
+                self.buffer = []
+            blob = bucket.blob(f"{self.run_prefix}/checkpoint.json")
+            blob.upload_from_string(json.dumps(self.checkpoint, indent=2), content_type='application/json')
+
+    def harvest_restaurant(name, limiter, writer, watermark=None):
+        state = writer.checkpoint.get(name, {})
+        if state.get("complete"):
+            return
+        page = state.get("last_page", 0) + 1
+        while True:
+            date_start = watermark["date"] if watermark else None
+            articles, pages = fetch_with_resume(limiter, fetch_articles_page, name, page, limiter, date_start)
+            if articles is None:
+                return  # Leave the checkpoint where it is so the next run retries this page
+            last_page = min(pages, max_pages) if max_pages else pages
+            complete = page >= last_page
+            if watermark:
+                # Results are newest first, so stop paging once we reach already ingested articles
+                new_articles = [article for article in articles if article_date(article) > watermark["date"]]
+                complete = complete or len(new_articles) < len(articles)
+                articles = new_articles
+            writer.add_page(name, page, articles, complete)
+            if complete:
+                return
+            page += 1
+
+    restaurant_names = read_restaurant_names_gcs(bucket_name, restaurants_csv_path)
+    if not harvest_run_id:
+        csv_name = os.path.splitext(os.path.basename(restaurants_csv_path))[0]
+        harvest_run_id = f"{csv_name}_{datetime.now().strftime('%Y%m%d')}"
+    run_prefix = f"{harvest_prefix}/{harvest_run_id}"
+    writer = HarvestWriter(run_prefix)
+    limiter = TokenBucket(requests_per_second)
+
+    # Watermarks hold the newest article already ingested per restaurant name
+    watermarks_blob = bucket.blob(f"{harvest_prefix}/watermarks.json")
+    watermarks = json.loads(watermarks_blob.download_as_text()) if watermarks_blob.exists() else {}
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(harvest_restaurant, name, limiter, writer,
+                                       watermarks.get(name) if incremental else None): name
+                       for name in restaurant_names}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except RateLimitException as e:
+                    print(e)
+    finally:
+        writer.flush()
+
+    for name, state in writer.checkpoint.items():
+        newest_date = state.get("newest_article_date")
+        if state.get("complete") and newest_date and newest_date > watermarks.get(name, {}).get("date", ""):
+            watermarks[name] = {"date": newest_date, "uri": state.get("newest_article_uri")}
+    watermarks_blob.upload_from_string(json.dumps(watermarks, indent=2), content_type='application/json')
+
+    # Copy the saved chunks into the JSONL output one at a time, including any from earlier attempts
+    output = gzip.open(output_file_path, 'wt', encoding='utf-8') if compress else open(output_file_path, 'w')
+    with output as f:
+        for blob in sorted(storage_client.list_blobs(bucket, prefix=f"{run_prefix}/part-"), key=lambda b: b.name):
+            for line in blob.download_as_text().splitlines():
+                if line:
+                    f.write(line + "\n")
+
+@component(base_image="python:3.8")
+def deduplicate_articles_component(
+    input_json_path: InputPath('jsonl'),
+    output_json_path: OutputPath('jsonl'),
+    duplicates_json_path: OutputPath('json'),
+    shingle_size: int = 5,
+    num_perm: int = 64,
+    num_bands: int = 8,
+    similarity_threshold: float = 0.8,
+    compress: bool = False,
+):
+    """
+    Drops exact duplicates (by URL and by normalised body hash) and collapses near-duplicate
+    bodies with MinHash/LSH before they reach the LLM. Each kept article carries the
+    source_urls of every copy it stands for, and the full mapping is written to duplicates_json_path.
+    The input is read twice (find duplicates, then write kept articles) so article bodies are never held in memory.
+    """
+    # Import libraries
+    import gzip
+    import hashlib
+    import json
+    import logging
+    import random
+    import re
+    import unicodedata
+    from urllib.parse import urlsplit
+
+    logging.basicConfig(level=logging.INFO)
+
+    def normalize_text(text):
+        text = unicodedata.normalize("NFKC", text or "").lower()
+        text = re.sub(r"[^\w\s]", " ", text)
+        return re.sub(r"\s+", " ", text).strip()
+
+    def normalize_url(url):
+        parts = urlsplit(url.strip().lower())
+        netloc = parts.netloc[4:] if parts.netloc.startswith("www.") else parts.netloc
+        return netloc + parts.path.rstrip("/")
+
+    # MinHash with universal hashing over 64-bit shingle hashes
+    mersenne_prime = (1 << 61) - 1
+    rng = random.Random(42)
+    permutations = [(rng.randrange(1, mersenne_prime), rng.randrange(0, mersenne_prime)) for _ in range(num_perm)]
+    rows = num_perm // num_bands
+
+    def minhash_signature(words):
+        shingles = {
+            int.from_bytes(hashlib.blake2b(" ".join(words[i:i + shingle_size]).encode(), digest_size=8).digest(), "big")
+            for i in range(max(1, len(words) - shingle_size + 1))
+        }
+        return [min((a * x + b) % mersenne_prime for x in shingles) for a, b in permutations]
+
+    def estimated_similarity(sig_a, sig_b):
+        return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / num_perm
+
+    def open_jsonl(path, mode):
+        # Readers sniff the gzip magic bytes, so compressed and plain artifacts can be mixed
+        if mode == 'r':
+            with open(path, 'rb') as f:
+                compressed = f.read(2) == b"\x1f\x8b"
+        else:
+            compressed = compress
+        return gzip.open(path, mode + 't', encoding='utf-8') if compressed else open(path, mode, encoding='utf-8')
+
+    def read_jsonl(path):
+        with open_jsonl(path, 'r') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    kept_positions = [] # input line number of each kept article
+    source_urls = []    # every source url per kept article
+    seen_urls = {}      # normalised url -> index into kept
+    seen_hashes = {}    # normalised body hash -> index into kept
+    signatures = []     # MinHash signature per kept article
+    lsh_buckets = {}    # (band, band hash) -> indexes into kept
+    stats = {"exact_url": 0, "exact_body": 0, "near_duplicate": 0}
+
+    total = 0
+    for position, article in enumerate(read_jsonl(input_json_path)):
+        total += 1
+        url_key = normalize_url(article["url"])
+        if url_key in seen_urls:
+            # The same article is often returned for several restaurants, so the url is usually already listed
+            urls = source_urls[seen_urls[url_key]]
+            if article["url"] not in urls:
+                urls.append(article["url"])
+            stats["exact_url"] += 1
+            continue
+
+        text = normalize_text(article["text"])
+        # Articles without a body have nothing to compare, so they are only deduplicated by url
+        body_hash = hashlib.sha1(text.encode()).hexdigest() if text else None
+        match = seen_hashes.get(body_hash) if text else None
+        if match is not None:
+            stats["exact_body"] += 1
+        elif text:
+            signature = minhash_signature(text.split(" "))
+            band_keys = [(band, hash(tuple(signature[band * rows:(band + 1) * rows]))) for band in range(num_bands)]
+            candidates = {idx for key in band_keys for idx in lsh_buckets.get(key, [])}
+            for idx in sorted(candidates):
+                if estimated_similarity(signature, signatures[idx]) >= similarity_threshold:
+                    match = idx
+                    stats["near_duplicate"] += 1
+                    break
+
+        if match is not None:
+            source_urls[match].append(article["url"])
+            seen_urls[url_key] = match
+            continue
 
-    with open(output_file_path, 'w') as f:
-        json.dump(all_articles_data, f, indent=2)
+        idx = len(kept_positions)
+        kept_positions.append(position)
+        source_urls.append([article["url"]])
+        seen_urls[url_key] = idx
+        signatures.append(signature if text else [])
+        if text:
+            seen_hashes[body_hash] = idx
+            for key in band_keys:
+                lsh_buckets.setdefault(key, []).append(idx)
+
+    removed = total - len(kept_positions)
+    logging.info(f"Deduplication kept {len(kept_positions)} of {total} articles, removed {removed}: {stats}")
+
+    # Second pass: stream the kept articles through with the source urls they stand for
+    kept_index = {position: idx for idx, position in enumerate(kept_positions)}
+    with open_jsonl(output_json_path, 'w') as f:
+        for position, article in enumerate(read_jsonl(input_json_path)):
+            idx = kept_index.get(position)
+            if idx is not None:
+                f.write(json.dumps({**article, "source_urls": source_urls[idx]}) + "\n")
+
+    # Kept URL -> every source URL it represents, so extracted relationships can be attributed back
+    duplicates = {urls[0]: urls for urls in source_urls if len(urls) > 1}
+    with open(duplicates_json_path, 'w') as f:
+        json.dump(duplicates, f, indent=2)
+
+@component(
+    packages_to_install=["google-cloud-storage"],
+    base_image="python:3.8"
+)
+def prefilter_articles_component(
+    input_json_path: InputPath('jsonl'),
+    output_json_path: OutputPath('jsonl'),
+    skipped_json_path: OutputPath('jsonl'),
+    bucket_name: str,
+    project_id: str,
+    threshold: float = 0.0,
+    labelled_json_path: str = "",
+    compress: bool = False,
+):
+    """
+    Scores each article locally for likely buyer-supplier mentions and only passes articles scoring
+    at least `threshold` on to the LLM. A sentence with supply language contributes when it and its
+    neighbouring sentences name two or more capitalised entities; strong phrases ("supplied by",
+    "sources from") count double.
+    The filter is opt-in: a threshold of 0 passes every article through. A threshold of 2 skipped
+    4 of 42 relationship-bearing articles in the labelled data it was tuned on, so enable it only
+    when the saved calls are worth that recall.
+    If labelled_json_path points at a past extraction output in GCS, recall is estimated on it.
+    """
+    # Import libraries
+    import gzip
+    import json
+    import logging
+    import re
+    from google.cloud import storage
+
+    logging.basicConfig(level=logging.INFO)
+
+    def open_jsonl(path, mode):
+        # Readers sniff the gzip magic bytes, so compressed and plain artifacts can be mixed
+        if mode == 'r':
+            with open(path, 'rb') as f:
+                compressed = f.read(2) == b"\x1f\x8b"
+        else:
+            compressed = compress
+        return gzip.open(path, mode + 't', encoding='utf-8') if compressed else open(path, mode, encoding='utf-8')
+
+    def read_jsonl(path):
+        with open_jsonl(path, 'r') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    strong_pattern = re.compile(
+        r"\b(supplied by|supplies|supplier|suppliers|sourced from|sources from|sourcing from|bought from|"
+        r"buys from|provided by|delivered by|grown by|produced by|reared by|caught by|teamed up with|"
+        r"worked with|works with|working with|in partnership with|partnered with)\b", re.IGNORECASE)
+    weak_pattern = re.compile(
+        r"\b(supply|supplying|source|sources|sourcing|partner|partners|partnered|partnership|provides|"
+        r"providing|delivers|deliveries|producer|producers|farm|farms|farmer|farmers|grower|growers|"
+        r"wholesaler|wholesale|butcher|fishmonger|dairy|creamery|bakery|roaster|winery|stockist|makers)\b",
+        re.IGNORECASE)
+    entity_pattern = re.compile(r"\b[A-Z][\w&'’-]*(?:\s+(?:&\s+|of\s+|de\s+)?[A-Z][\w&'’-]*)*")
+    sentence_split = re.compile(r"(?<=[.!?])\s+|\n+")
+
+    def relevance_score(text):
+        sentences = [sentence for sentence in sentence_split.split(text or "") if sentence.strip()]
+        # Skip the sentence-initial word, which is capitalised regardless of being a name
+        entities = [{m.group(0) for m in entity_pattern.finditer(sentence) if m.start() > 0}
+                    for sentence in sentences]
+        score = 0.0
+        for idx, sentence in enumerate(sentences):
+            hits = 2 * len(strong_pattern.findall(sentence)) + len(weak_pattern.findall(sentence))
+            # Buyer and supplier are often introduced in adjacent sentences
+            if hits and len(set().union(*entities[max(0, idx - 1):idx + 2])) >= 2:
+                score += min(hits, 4)
+        return score
+
+    kept, skipped = 0, 0
+    with open_jsonl(output_json_path, 'w') as kept_file, open_jsonl(skipped_json_path, 'w') as skipped_file:
+        for article in read_jsonl(input_json_path):
+            if threshold <= 0 or relevance_score(article["text"]) >= threshold:
+                kept_file.write(json.dumps(article) + "\n")
+                kept += 1
+            else:
+                skipped_file.write(json.dumps(article) + "\n")
+                skipped += 1
+
+    logging.info(f"Pre-filter kept {kept} of {kept + skipped} articles and skipped {skipped} "
+                 f"({skipped / max(1, kept + skipped):.0%}) at threshold {threshold}")
+
+    # Estimate recall on past outputs: articles the LLM found relationships in count as positives
+    if labelled_json_path and threshold > 0:
+        try:
+            bucket = storage.Client(project=project_id).bucket(bucket_name)
+            labelled_text = bucket.blob(labelled_json_path).download_as_text()
+            # Past outputs are either a JSON list or JSONL with one article per line
+            if labelled_text.lstrip().startswith("["):
+                labelled = json.loads(labelled_text)
+            else:
+                labelled = [json.loads(line) for line in labelled_text.splitlines() if line.strip()]
+            positives = [item for item in labelled if item.get("relationships")]
+            negatives = [item for item in labelled if not item.get("relationships")]
+            recalled = sum(1 for item in positives if relevance_score(item["text"]) >= threshold)
+            rejected = sum(1 for item in negatives if relevance_score(item["text"]) < threshold)
+            logging.info(f"Estimated recall {recalled / max(1, len(positives)):.1%} on {len(positives)} labelled "
+                         f"positives; {rejected} of {len(negatives)} labelled negatives would be skipped")
+        except Exception as e:
+            logging.warning(f"Could not estimate recall from {labelled_json_path}: {e}")
+
+@component(base_image="python:3.8")
+def shard_articles_component(
+    input_json_path: InputPath('jsonl'),
+    shards_path: OutputPath('jsonl'),
+    shard_size: int = 500,
+    compress: bool = False,
+) -> list:
+    """
+    Splits the articles into shard files of at most shard_size articles inside the shards_path directory.
+    Returns the shard file names so the pipeline can fan out over them.
+    """
+    # Import libraries
+    import gzip
+    import json
+    import logging
+    import os
+
+    logging.basicConfig(level=logging.INFO)
+
+    def open_jsonl(path, mode):
+        # Readers sniff the gzip magic bytes, so compressed and plain artifacts can be mixed
+        if mode == 'r':
+            with open(path, 'rb') as f:
+                compressed = f.read(2) == b"\x1f\x8b"
+        else:
+            compressed = compress
+        return gzip.open(path, mode + 't', encoding='utf-8') if compressed else open(path, mode, encoding='utf-8')
+
+    def read_jsonl(path):
+        with open_jsonl(path, 'r') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    os.makedirs(shards_path, exist_ok=True)
+    shard_names = []
+    shard_file = None
+    total = 0
+    for total, article in enumerate(read_jsonl(input_json_path), 1):
+        if (total - 1) % shard_size == 0:
+            if shard_file:
+                shard_file.close()
+            shard_name = f"shard_{len(shard_names):05d}.jsonl"
+            shard_file = open_jsonl(os.path.join(shards_path, shard_name), 'w')
+            shard_names.append(shard_name)
+        shard_file.write(json.dumps(article) + "\n")
+    if shard_file:
+        shard_file.close()
+
+    logging.info(f"Split {total} articles into {len(shard_names)} shards of up to {shard_size}")
+    return shard_names
 
-# This could improve with parallel processing
 @component(
-    packages_to_install=["google-cloud-storage", "openai", "pydantic", "langchain", "langchain-openai"],
+    packages_to_install=["google-cloud-storage", "openai", "pydantic", "langchain", "langchain-openai", "tiktoken"],
     base_image="python:3.8"
 )
 def process_articles_component(
-    input_json_path: InputPath('json'),
-    output_json_path: OutputPath('json'),
+    input_json_path: InputPath('jsonl'),
+    output_json_path: OutputPath('jsonl'),
     openai_api_key: str,
     bucket_name: str,
     project_id: str,
-    output_folder: str
+    output_folder: str,
+    max_concurrency: int = 8,
+    tokens_per_minute: int = 40000,
+    max_retries: int = 6,
+    shard_name: str = "",
+    cache_prefix: str = "extraction_cache",
+    passage_token_budget: int = 1500,
+    max_passages_per_article: int = 4,
+    pack_token_budget: int = 0,
+    max_articles_per_pack: int = 8,
+    batch_size: int = 200,
+    compress: bool = False,
 ):
     # Import libraries
     from typing import List
+    import asyncio
+    import gzip
+    import hashlib
     import json
     import logging
+    import os
+    import random
+    import re
+    import time
+    import tiktoken
+    from concurrent.futures import ThreadPoolExecutor
     from google.cloud import storage
+    from openai import RateLimitError
     from pydantic import BaseModel, Field
     from langchain.prompts import PromptTemplate
     from langchain.output_parsers import PydanticOutputParser
@@ -147,11 +644,19 @@ def process_articles_component(
         text: str = Field(description="The text of the article")
         relationships: List[Relationship] = Field(description="List of buyer-supplier relationships")
 
+    class PackedArticleRelationships(BaseModel):
+        id: str = Field(description="The ID of the article, exactly as given in the input, e.g. a0")
+        relationships: List[Relationship] = Field(description="List of buyer-supplier relationships in this article")
+
+    class PackedRelationshipsData(BaseModel):
+        articles: List[PackedArticleRelationships] = Field(description="One entry per input article")
+
     logging.basicConfig(level=logging.INFO)
 
     # Initialize OpenAI and LangChain components securely
+    model_name = "gpt-4"
     try:
-        model = ChatOpenAI(api_key=openai_api_key, model="gpt-4", temperature=0)
+        model = ChatOpenAI(api_key=openai_api_key, model=model_name, temperature=0)
     except Exception as e:
         logging.error(f"Error initializing ChatOpenAI: {e}")
         raise
@@ -203,40 +708,424 @@ def process_articles_component(
 
     chain = prompt | model | parser
 
-    try:
-        with open(input_json_path, 'r') as f:
-            articles = json.load(f)
-    except Exception as e:
-        logging.error(f"Error reading input JSON from GCS: {e}")
-        raise
+    # Packed mode sends several short articles in one request, so the instructions are only paid for once
+    packed_prompt_template = """
+    Please help identify all buyer-supplier relationships present in each of the provided articles. 
+    The primary objective of this project is to pinpoint entities within the restaurant industry for NER purposes, and to delineate supply chains. 
+    Extract instances where one organization provides goods or services to another, requiring the naming of both parties involved.
+    Important Instructions 
+    1. Return exactly one entry per article, using the ID given in its << ARTICLE id: ... >> header (e.g. "a0").
+    2. Do not add a buyer-supplier relationship unless specific names of buyer and supplier organisations can be found. 
+       This means examples like "Customers", "Restaurants", "Michelin Guide" do not count and should be excluded. 
+       You can leave the relationships key empty like this - "relationships": []
+    3. Each buyer-supplier relationship should only include 1 buyer and 1 supplier. 
+    4. Only use information from an article for that article's entry.
 
-    processed_texts = []
 
-    for article in articles:
-        try:
-            processed_text = chain.invoke({"url_text": article["text"]})
+    << FORMATTING >>
+    {format_instructions}
+
+    << INPUT >>
+    {articles_text}
+
+    << OUTPUT>>
+    Organize your findings into a JSON object following this structure:
+
+    JSON
+    {{
+        "articles": [
+            {{
+                "id": "a0",
+                "relationships": [
+                    {{
+                        "supplier": "Supplier Name",
+                        "buyer": "Buyer Name",
+                        "product": "Products involved",
+                        "location": "Supplier Location"
+                    }}
+                ]
+            }}
+            // One entry for every article ID in the input
+        ]
+    }}
+    """
+
+    packed_parser = PydanticOutputParser(pydantic_object=PackedRelationshipsData)
+
+    packed_prompt = PromptTemplate(
+        template=packed_prompt_template,
+        input_variables=["articles_text"],
+        partial_variables={"format_instructions": packed_parser.get_format_instructions()}
+    )
+
+    packed_chain = packed_prompt | model | packed_parser
 
-            relationships_dicts = [relationship.dict() for relationship in processed_text.relationships]
+    # When fanned out, input_json_path is the shards directory and shard_name picks this worker's shard
+    input_file_path = os.path.join(input_json_path, shard_name) if shard_name else input_json_path
 
-            article_data = {
-                "url": article["url"],
-                "text": article["text"],
-                "relationships": relationships_dicts
-            }
-            processed_texts.append(article_data)
+    def open_jsonl(path, mode):
+        # Readers sniff the gzip magic bytes, so compressed and plain artifacts can be mixed
+        if mode == 'r':
+            with open(path, 'rb') as f:
+                compressed = f.read(2) == b"\x1f\x8b"
+        else:
+            compressed = compress
+        return gzip.open(path, mode + 't', encoding='utf-8') if compressed else open(path, mode, encoding='utf-8')
+
+    def read_batches(path):
+        # Articles are read one line at a time and handed out in batches, so memory does not grow with the shard
+        batch = []
+        with open_jsonl(path, 'r') as f:
+            for line in f:
+                if line.strip():
+                    batch.append(json.loads(line))
+                if len(batch) == batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+    # Extraction cache: one GCS blob per (article text hash, prompt hash, model name).
+    # The prompt hash covers the template and format instructions, so editing either invalidates the cache.
+    # Passage selection settings change what the model sees, so they are part of the hash too
+    prompt_fingerprint = (prompt_template + parser.get_format_instructions() +
+                          f"passages:{passage_token_budget}:{max_passages_per_article}")
+    if pack_token_budget:
+        prompt_fingerprint += packed_prompt_template + f"pack:{pack_token_budget}:{max_articles_per_pack}"
+    prompt_hash = hashlib.sha256(prompt_fingerprint.encode()).hexdigest()[:16]
+    bucket = storage.Client(project=project_id).bucket(bucket_name) if cache_prefix else None
+
+    def cache_blob(article):
+        normalized_text = re.sub(r"\s+", " ", article["text"] or "").strip()
+        text_hash = hashlib.sha256(normalized_text.encode()).hexdigest()
+        return bucket.blob(f"{cache_prefix}/{model_name}/{prompt_hash}/{text_hash}.json")
+
+    def read_cache(article):
+        try:
+            return json.loads(cache_blob(article).download_as_text())["relationships"]
+        except Exception:
+            return None  # Missing blob or unreadable entry both count as a miss
 
+    def write_cache(article, relationships):
+        try:
+            cache_blob(article).upload_from_string(json.dumps({"relationships": relationships}),
+                                                   content_type='application/json')
         except Exception as e:
-            logging.warning(f"Error processing article {article['url']}: {e}")
-            continue
+            logging.warning(f"Could not write cache entry for {article['url']}: {e}")
+
+    # Local tokenizer for the budget and passage selection
+    encoding = tiktoken.encoding_for_model(model_name)
+    prompt_overhead_tokens = len(encoding.encode(prompt.format(url_text="")))
+    packed_overhead_tokens = len(encoding.encode(packed_prompt.format(articles_text="")))
+
+    supply_pattern = re.compile(
+        r"\b(suppl(?:y|ies|ied|ier|iers|ying)|sourc(?:e|es|ed|ing)|partner(?:s|ed|ship)?|provid(?:e|es|ed|ing)|"
+        r"deliver(?:s|ed|y|ies)?|produce(?:r|rs)?|grow(?:n|er|ers)|farm(?:s|er|ers)?|bought|buys|"
+        r"teamed up|worked with|works with|wholesale(?:r)?|stock(?:s|ed|ist))\b", re.IGNORECASE)
+    entity_pattern = re.compile(r"\b[A-Z][\w&'’-]*(?:\s+(?:&\s+|of\s+)?[A-Z][\w&'’-]*)*")
+    sentence_split = re.compile(r"(?<=[.!?])\s+|\n+")
+
+    def select_passages(text):
+        """
+        Returns the windows of text sent to the model. Short articles are sent whole; long ones are cut
+        down to sentences with supply language near an organisation-like name (plus one sentence of
+        context either side), packed in order into windows of at most passage_token_budget tokens.
+        """
+        if len(encoding.encode(text)) <= passage_token_budget:
+            return [text]
+
+        sentences = [sentence.strip() for sentence in sentence_split.split(text) if sentence.strip()]
+        has_entity = [any(m.start() > 0 for m in entity_pattern.finditer(sentence)) for sentence in sentences]
+        selected = set()
+        for idx, sentence in enumerate(sentences):
+            if supply_pattern.search(sentence) and any(has_entity[max(0, idx - 1):idx + 2]):
+                selected.update(range(max(0, idx - 1), min(len(sentences), idx + 2)))
+
+        windows, current, current_tokens = [], [], 0
+        for idx in sorted(selected) or range(len(sentences)):
+            tokens = len(encoding.encode(sentences[idx]))
+            if current and current_tokens + tokens > passage_token_budget:
+                windows.append(" ".join(current))
+                current, current_tokens = [], 0
+                if len(windows) == max_passages_per_article:
+                    break
+            if tokens <= passage_token_budget:
+                current.append(sentences[idx])
+                current_tokens += tokens
+        if current and len(windows) < max_passages_per_article:
+            windows.append(" ".join(current))
+        if not windows:
+            # Only over-long sentences (e.g. text without punctuation), so send the truncated start
+            return [encoding.decode(encoding.encode(text)[:passage_token_budget])]
+        # With nothing relevant selected, fall back to the start of the article
+        return windows if selected else windows[:1]
+
+    class TokenBudget:
+        """Per-minute token budget shared by all in-flight requests."""
+
+        def __init__(self, tokens_per_minute):
+            self.capacity = tokens_per_minute
+            self.tokens = tokens_per_minute
+            self.updated = time.monotonic()
+            self.lock = asyncio.Lock()
+
+        async def acquire(self, tokens):
+            tokens = min(tokens, self.capacity)
+            async with self.lock:
+                while True:
+                    now = time.monotonic()
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.capacity / 60)
+                    self.updated = now
+                    if self.tokens >= tokens:
+                        self.tokens -= tokens
+                        return
+                    await asyncio.sleep((tokens - self.tokens) * 60 / self.capacity)
+
+    # Shared between workers: a rate-limit error on any request cools everyone down,
+    # and the backoff shrinks again as requests succeed. The errors from requests that were
+    # already in flight belong to the same rate-limit event, so the delay only doubles once
+    # the previous escalation is older than the current delay
+    backoff = {"seconds": 1.0, "cooldown_until": 0.0, "escalated_at": 0.0, "retries": 0}
 
+    token_stats = {"article_tokens": 0, "prompt_tokens": 0}
+    pack_stats = {"packs": 0, "fallbacks": 0}
+
+    async def call_model(runnable, inputs, tokens, label, semaphore, budget):
+        """Runs one LLM request under the concurrency limit, token budget and shared backoff."""
+        token_stats["prompt_tokens"] += tokens
+        async with semaphore:
+            for attempt in range(max_retries + 1):
+                wait = backoff["cooldown_until"] - time.monotonic()
+                if wait > 0:
+                    # Jitter so the workers do not all retry at the same moment
+                    await asyncio.sleep(wait + random.uniform(0, min(1.0, wait)))
+                await budget.acquire(tokens)
+                try:
+                    result = await runnable.ainvoke(inputs)
+                    backoff["seconds"] = max(1.0, backoff["seconds"] / 2)
+                    return result
+                except RateLimitError as e:
+                    backoff["retries"] += 1
+                    now = time.monotonic()
+                    if now - backoff["escalated_at"] >= backoff["seconds"]:
+                        backoff["seconds"] = min(60.0, backoff["seconds"] * 2)
+                        backoff["escalated_at"] = now
+                    backoff["cooldown_until"] = max(backoff["cooldown_until"],
+                                                    now + backoff["seconds"] * random.uniform(0.5, 1))
+                    logging.warning(f"Rate limited on {label} (attempt {attempt + 1}): {e}")
+                except Exception as e:
+                    logging.warning(f"Error processing {label}: {e}")
+                    return None
+            logging.warning(f"Giving up on {label} after {max_retries} retries")
+            return None
+
+    async def extract_passage(url, passage, passage_tokens, semaphore, budget):
+        result = await call_model(chain, {"url_text": passage}, prompt_overhead_tokens + passage_tokens,
+                                  f"article {url}", semaphore, budget)
+        return None if result is None else [relationship.dict() for relationship in result.relationships]
+
+    async def extract_pack(pack, semaphore, budget):
+        """
+        Extracts a pack of (url, passage, tokens) units in one request. Any article missing from
+        the response, or the whole pack on a parse failure, falls back to single-article calls.
+        """
+        if len(pack) == 1:
+            return [await extract_passage(*pack[0], semaphore, budget)]
+
+        pack_stats["packs"] += 1
+        articles_text = "\n\n".join(f"<< ARTICLE id: a{idx} >>\n{passage}" for idx, (_, passage, _) in enumerate(pack))
+        tokens = packed_overhead_tokens + len(encoding.encode(articles_text))
+        result = await call_model(packed_chain, {"articles_text": articles_text}, tokens,
+                                  f"pack of {len(pack)} articles", semaphore, budget)
+        found = {}
+        if result is None:
+            pack_stats["fallbacks"] += 1
+        else:
+            for entry in result.articles:
+                # Models echo the ID as "a0", "A0", "ARTICLE a0" or "Article 0", so match on the number only
+                number = re.search(r"\d+", entry.id or "")
+                if number:
+                    found[int(number.group())] = [relationship.dict() for relationship in entry.relationships]
+
+        missing = [idx for idx in range(len(pack)) if idx not in found]
+        retried = await asyncio.gather(*(extract_passage(*pack[idx], semaphore, budget) for idx in missing))
+        outputs = [found.get(idx) for idx in range(len(pack))]
+        for idx, relationships in zip(missing, retried):
+            outputs[idx] = relationships
+        return outputs
+
+    def build_packs(units):
+        """Greedily fills packs in input order up to pack_token_budget tokens of article text."""
+        if not pack_token_budget:
+            return [[unit] for unit in units]
+        packs, current, current_tokens = [], [], 0
+        for unit in units:
+            tokens = unit[2]
+            if current and (current_tokens + tokens > pack_token_budget or len(current) == max_articles_per_pack):
+                packs.append(current)
+                current, current_tokens = [], 0
+            current.append(unit)
+            current_tokens += tokens
+        if current:
+            packs.append(current)
+        return packs
+
+    def merge_relationships(results):
+        # One failed window fails the whole article, so a partial result is never written or cached
+        # and the article is retried on the next run
+        if not results or any(result is None for result in results):
+            return None
+        # Merge the relationships found in each window, dropping repeats
+        merged, seen = [], set()
+        for relationships in results:
+            for relationship in relationships or []:
+                key = tuple(sorted(relationship.items()))
+                if key not in seen:
+                    seen.add(key)
+                    merged.append(relationship)
+        return merged
+
+    async def extract_all(articles, semaphore, budget):
+        # Every selected passage of every article is a unit of work; packs group several units per request
+        units, owners = [], []
+        for pos, article in enumerate(articles):
+            token_stats["article_tokens"] += len(encoding.encode(article["text"]))
+            for passage in select_passages(article["text"]):
+                units.append((article["url"], passage, len(encoding.encode(passage))))
+                owners.append(pos)
+        packs = build_packs(units)
+
+        # gather keeps results in input order, so the output order is deterministic
+        pack_outputs = await asyncio.gather(*(extract_pack(pack, semaphore, budget) for pack in packs))
+        per_article = [[] for _ in articles]
+        unit_outputs = [output for outputs in pack_outputs for output in outputs]
+        for pos, relationships in zip(owners, unit_outputs):
+            per_article[pos].append(relationships)
+        return [merge_relationships(results) for results in per_article]
+
+    stats = {"articles": 0, "hits": 0, "misses": 0, "extracted": 0}
+
+    async def process_all(output_file):
+        # Created inside the running loop, as Python 3.8 binds these primitives to a loop on creation
+        semaphore = asyncio.Semaphore(max_concurrency)
+        budget = TokenBudget(tokens_per_minute)
+
+        for articles in read_batches(input_file_path):
+            cached = [None] * len(articles)
+            if bucket:
+                with ThreadPoolExecutor(max_workers=16) as executor:
+                    cached = list(executor.map(read_cache, articles))
+            misses = [idx for idx, relationships in enumerate(cached) if relationships is None]
+
+            extracted = await extract_all([articles[idx] for idx in misses], semaphore, budget)
+
+            results = list(cached)
+            for idx, relationships_dicts in zip(misses, extracted):
+                results[idx] = relationships_dicts
+
+            if bucket:
+                new_entries = [(articles[idx], relationships) for idx, relationships in zip(misses, extracted)
+                               if relationships is not None]
+                with ThreadPoolExecutor(max_workers=16) as executor:
+                    list(executor.map(lambda entry: write_cache(*entry), new_entries))
+
+            for article, relationships_dicts in zip(articles, results):
+                if relationships_dicts is None:
+                    continue
+
+                article_data = {
+                    "url": article["url"],
+                    "text": article["text"],
+                    "relationships": relationships_dicts,
+                    "source_urls": article.get("source_urls", [article["url"]])
+                }
+                output_file.write(json.dumps(article_data) + "\n")
+
+            stats["articles"] += len(articles)
+            stats["hits"] += len(articles) - len(misses)
+            stats["misses"] += len(misses)
+            stats["extracted"] += sum(1 for relationships in extracted if relationships is not None)
+
+    start_time = time.monotonic()
     try:
-        processed_texts_json = json.dumps(processed_texts, indent=2)
-        with open(output_json_path, 'w') as f:
-            f.write(processed_texts_json)
+        with open_jsonl(output_json_path, 'w') as output_file:
+            asyncio.run(process_all(output_file))
         logging.info("Successfully processed articles and saved output.")
     except Exception as e:
-        logging.error(f"Error saving processed texts: {e}")
+        logging.error(f"Error processing articles: {e}")
         raise
+    elapsed = time.monotonic() - start_time
+
+    if bucket:
+        logging.info(f"Extraction cache: {stats['hits']} hits, {stats['misses']} misses "
+                     f"(prompt {prompt_hash}, model {model_name})")
+    articles_per_minute = stats["extracted"] / elapsed * 60 if elapsed else 0.0
+    logging.info(f"Extracted {stats['extracted']} of {stats['misses']} uncached articles in {elapsed:.1f}s "
+                 f"({articles_per_minute:.1f} articles/min, {backoff['retries']} rate-limit retries)")
+    if stats["misses"]:
+        logging.info(f"Prompt tokens per article: {token_stats['prompt_tokens'] / stats['misses']:.0f} after passage "
+                     f"selection vs {prompt_overhead_tokens + token_stats['article_tokens'] / stats['misses']:.0f} "
+                     f"for whole articles")
+    if pack_token_budget:
+        logging.info(f"Packed {pack_stats['packs']} multi-article requests, "
+                     f"{pack_stats['fallbacks']} fell back to single-article calls")
+
+@component(base_image="python:3.8")
+def merge_processed_shards_component(
+    shards_path: InputPath('jsonl'),
+    processed_shards: Input[List[Artifact]],
+    output_json_path: OutputPath('jsonl'),
+    compress: bool = False,
+):
+    """
+    Reduces the per-shard extraction outputs into one JSONL file, in the original article order.
+    Each processed shard keeps its shard's order, so the shards only need ordering among themselves
+    before being streamed through line by line.
+    """
+    # Import libraries
+    import gzip
+    import json
+    import logging
+    import os
+
+    logging.basicConfig(level=logging.INFO)
+
+    def open_jsonl(path, mode):
+        # Readers sniff the gzip magic bytes, so compressed and plain artifacts can be mixed
+        if mode == 'r':
+            with open(path, 'rb') as f:
+                compressed = f.read(2) == b"\x1f\x8b"
+        else:
+            compressed = compress
+        return gzip.open(path, mode + 't', encoding='utf-8') if compressed else open(path, mode, encoding='utf-8')
+
+    def first_url(path):
+        with open_jsonl(path, 'r') as f:
+            for line in f:
+                if line.strip():
+                    return json.loads(line)["url"]
+        return None
+
+    # Collected outputs arrive in no guaranteed order, so map each url back to its input shard
+    shard_of_url = {}
+    for shard_idx, shard_name in enumerate(sorted(os.listdir(shards_path))):
+        with open_jsonl(os.path.join(shards_path, shard_name), 'r') as f:
+            for line in f:
+                if line.strip():
+                    shard_of_url.setdefault(json.loads(line)["url"], shard_idx)
+
+    ordered_shards = sorted(processed_shards,
+                            key=lambda shard: shard_of_url.get(first_url(shard.path), len(shard_of_url)))
+
+    merged = 0
+    with open_jsonl(output_json_path, 'w') as output_file:
+        for processed_shard in ordered_shards:
+            with open_jsonl(processed_shard.path, 'r') as f:
+                for line in f:
+                    if line.strip():
+                        output_file.write(line if line.endswith("\n") else line + "\n")
+                        merged += 1
+    logging.info(f"Merged {len(processed_shards)} shards into {merged} processed articles")
 
 @dsl.pipeline(
     name=f'kfp-{NOTEBOOK}',
@@ -249,6 +1138,20 @@ def supply_chain_pipeline(
     bucket_name: str,
     restaurants_csv_path: str,
     output_folder: str,
+    fetch_max_workers: int = 8,
+    fetch_requests_per_second: float = 5.0,
+    harvest_run_id: str = "",
+    incremental: bool = False,
+    dedup_similarity_threshold: float = 0.8,
+    extraction_max_concurrency: int = 8,
+    extraction_tokens_per_minute: int = 40000,
+    shard_size: int = 500,
+    extraction_cache_prefix: str = "extraction_cache",
+    prefilter_threshold: float = 0.0,
+    prefilter_labelled_json_path: str = "processed_output/restaurant_supply_chain_relationships.json",
+    passage_token_budget: int = 1500,
+    pack_token_budget: int = 0,
+    compress_artifacts: bool = False,
 ):
     # Component invocation
     fetch_articles_task = fetch_and_store_articles(
@@ -256,15 +1159,59 @@ def supply_chain_pipeline(
         project_id=project_id,
         bucket_name=bucket_name,
         restaurants_csv_path=restaurants_csv_path,
+        max_workers=fetch_max_workers,
+        requests_per_second=fetch_requests_per_second,
+        harvest_run_id=harvest_run_id,
+        incremental=incremental,
+        compress=compress_artifacts,
     )
 
-    # Use the output from the previous component as input for the next one
-    process_articles_task = process_articles_component(
+    # Drop duplicate and near-duplicate articles before they are sent to the LLM
+    deduplicate_articles_task = deduplicate_articles_component(
         input_json_path=fetch_articles_task.outputs['output_file_path'],
-        openai_api_key=openai_api_key,
+        similarity_threshold=dedup_similarity_threshold,
+        compress=compress_artifacts,
+    )
+
+    # Skip articles that are unlikely to name a buyer-supplier pair before paying for an LLM call
+    prefilter_articles_task = prefilter_articles_component(
+        input_json_path=deduplicate_articles_task.outputs['output_json_path'],
         bucket_name=bucket_name,
         project_id=project_id,
-        output_folder=output_folder,
+        threshold=prefilter_threshold,
+        labelled_json_path=prefilter_labelled_json_path,
+        compress=compress_artifacts,
+    )
+
+    # Split the articles into shards so extraction can fan out across workers
+    shard_articles_task = shard_articles_component(
+        input_json_path=prefilter_articles_task.outputs['output_json_path'],
+        shard_size=shard_size,
+        compress=compress_artifacts,
+    )
+
+    # Use the output from the previous component as input for the next one, one worker per shard
+    with dsl.ParallelFor(items=shard_articles_task.outputs['Output'], parallelism=EXTRACTION_PARALLELISM) as shard_name:
+        process_articles_task = process_articles_component(
+            input_json_path=shard_articles_task.outputs['shards_path'],
+            shard_name=shard_name,
+            openai_api_key=openai_api_key,
+            bucket_name=bucket_name,
+            project_id=project_id,
+            output_folder=output_folder,
+            max_concurrency=extraction_max_concurrency,
+            tokens_per_minute=extraction_tokens_per_minute,
+            cache_prefix=extraction_cache_prefix,
+            passage_token_budget=passage_token_budget,
+            pack_token_budget=pack_token_budget,
+            compress=compress_artifacts,
+        )
+
+    # Merge the shard outputs back into a single file
+    merge_processed_shards_task = merge_processed_shards_component(
+        shards_path=shard_articles_task.outputs['shards_path'],
+        processed_shards=dsl.Collected(process_articles_task.outputs['output_json_path']),
+        compress=compress_artifacts,
     )
 
 def upload_blob(bucket_name, source_file_name, destination_blob_name):
@@ -283,7 +1230,7 @@ PROJECT_ID = PROJECT_ID
 REGION = 'us-east1'
 # PIPELINE_NAME = f'kfp-{NOTEBOOK}-{DATANAME}-{TIMESTAMP}'
 
-def run_pipeline_job(restaurants_csv_path, output_folder):
+def run_pipeline_job(restaurants_csv_path, output_folder, incremental=False, shard_size=500):
     """Runs the Vertex AI pipeline job with dynamic input and output paths."""
     # Initialize the Vertex AI client
     aiplatform.init(project=PROJECT_ID, location=REGION)
@@ -297,6 +1244,8 @@ def run_pipeline_job(restaurants_csv_path, output_folder):
             'bucket_name': BUCKET,
             'restaurants_csv_path': restaurants_csv_path,
             'output_folder': output_folder,
+            'incremental': incremental,
+            'shard_size': shard_size,
         },
         enable_caching=False
     )
@@ -307,7 +1256,11 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Run Vertex AI and ML Pipelines with dynamic input and output')
     parser.add_argument('--input_csv', type=str, required=True, help='Path to the input CSV file containing restaurant names')
     parser.add_argument('--output_path', type=str, required=True, help='Output path in the bucket for the final data')
+    parser.add_argument('--incremental', action='store_true', help='Only fetch articles newer than each restaurant\'s watermark')
+    parser.add_argument('--shard_size', type=int, default=500, help='Number of articles per extraction shard')
+    parser.add_argument('--parallelism', type=int, default=EXTRACTION_PARALLELISM, help='Number of extraction shards processed at once')
     args = parser.parse_args()
+    EXTRACTION_PARALLELISM = args.parallelism
 
     # Constructing the dynamic paths based on input arguments
     restaurants_csv_dynamic_path = f'restaurant_names/{args.input_csv}'
@@ -324,6 +1277,6 @@ if __name__ == "__main__":
     upload_blob(BUCKET, f"{DIR}/{NOTEBOOK}.yaml", destination_blob_name)
 
     # Run the pipeline job with the dynamic paths
-    run_pipeline_job(restaurants_csv_dynamic_path, output_folder_dynamic_path)
+    run_pipeline_job(restaurants_csv_dynamic_path, output_folder_dynamic_path, args.incremental, args.shard_size)
 
     print("Completed the pipeline successfully")
\ No newline at end of file
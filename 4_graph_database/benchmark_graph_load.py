@@ -0,0 +1,90 @@
+"""
+This script benchmarks the relationship load of transform_and_write_to_neo4j.py on synthetic graphs.
+A fixed number of relationships is inserted into graphs of growing node count, so the time per relationship
+should stay flat when endpoints are matched by label and indexed id.
+With several --workers values it also measures the speedup of the parallel partitioned relationship load.
+Run it against a scratch Neo4j database - it clears the database between sizes - or with --in_memory.
+"""
+
+# Import libraries
+import argparse
+import random
+import time
+import pandas as pd
+from graph_store import open_graph_store, InMemoryGraphStore, BATCH_SIZE
+
+
+def label_less_relationship_query(rel_type):
+    # The statement the loader used before relationships were matched by label, kept for comparison
+    return (
+        f"UNWIND $rows AS row "
+        f"MATCH (s {{id: row.source_id}}), (b {{id: row.target_id}}) "
+        f"MERGE (s)-[:{rel_type} {{product: row.product, location: row.location}}]->(b)"
+    )
+
+
+def synthetic_graph(node_count, relationship_count, seed=42):
+    rng = random.Random(seed)
+    suppliers = [{'id': f"sup_{idx}", 'name': f"Supplier {idx}", 'aliases': [], 'tier': 1}
+                 for idx in range(node_count // 2)]
+    restaurants = [{'id': f"res_{idx}", 'name': f"Restaurant {idx}", 'aliases': [], 'tier': 0}
+                   for idx in range(node_count - len(suppliers))]
+    relationships = [{
+        'source_id': rng.choice(suppliers)['id'],
+        'target_id': rng.choice(restaurants)['id'],
+        'product': rng.choice(["meat", "fish", "vegetables", "cheese", "wine"]),
+        'location': "London",
+    } for _ in range(relationship_count)]
+    return ({'Supplier': pd.DataFrame(suppliers), 'Restaurant': pd.DataFrame(restaurants)},
+            pd.DataFrame(relationships))
+
+
+def run_benchmark(store, node_count, relationship_count, label_less, workers=1):
+    nodes, relationships = synthetic_graph(node_count, relationship_count)
+    store.clear()
+    store.create_schema()
+
+    for label, rows in nodes.items():
+        store.merge_nodes(label, rows)
+
+    store.workers = workers
+    start = time.monotonic()
+    if label_less:
+        store.write_rows(label_less_relationship_query('SUPPLIES'), relationships, parallel=workers > 1)
+    else:
+        store.merge_relationships('SUPPLIES', relationships)
+    return time.monotonic() - start
+
+
+def main(sizes, relationship_count, batch_size, label_less, worker_counts, in_memory=False):
+    store = InMemoryGraphStore() if in_memory else open_graph_store(None, batch_size)
+    print(f"{'nodes':>10} {'relationships':>14} {'workers':>8} {'seconds':>9} {'ms per 1k rels':>15} {'speedup':>8}")
+    for node_count in sizes:
+        baseline = None
+        for workers in worker_counts:
+            elapsed = run_benchmark(store, node_count, relationship_count, label_less, workers)
+            baseline = baseline or elapsed
+            print(f"{node_count:>10} {relationship_count:>14} {workers:>8} {elapsed:>9.2f} "
+                  f"{elapsed / relationship_count * 1e6:>15.1f} {baseline / elapsed:>8.2f}")
+    store.clear()
+    store.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark relationship insert time as the graph grows')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help='Node counts to benchmark')
+    parser.add_argument('--relationships', type=int, default=5000, help='Relationships inserted at every size')
+    parser.add_argument('--batch_size', type=int, default=BATCH_SIZE, help='Rows written per transaction')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1],
+                        help='Worker counts to compare, the first one is the speedup baseline')
+    parser.add_argument('--label_less', action='store_true', help='Match endpoints without labels, as the loader used to')
+    parser.add_argument('--in_memory', action='store_true', help='Load an in-memory graph instead of Neo4j')
+    args = parser.parse_args()
+    if args.in_memory and args.label_less:
+        parser.error("--label_less only applies to Neo4j")
+    main(args.sizes, args.relationships, args.batch_size, args.label_less, args.workers, args.in_memory)
+
+# To run this script against a local Neo4j container
+# python benchmark_graph_load.py --sizes 1000 10000 100000
+# python benchmark_graph_load.py --sizes 100000 --relationships 200000 --workers 1 2 4 8
+# python benchmark_graph_load.py --sizes 1000 10000 100000 --in_memory
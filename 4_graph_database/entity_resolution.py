@@ -0,0 +1,165 @@
+"""
+Entity resolution for the names extracted by the LLM.
+The same company is often named several ways ("Natoora", "Natoora Ltd", "natoora"), and each variant would become its
+own node. Names are normalized, grouped into candidate blocks by token, prefix and phonetic keys, and only names
+sharing a block are compared, so the work stays close to linear in the number of distinct names.
+"""
+
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+
+# Tokens that do not distinguish one company from another
+LEGAL_SUFFIXES = {"ltd", "limited", "plc", "llc", "llp", "inc", "incorporated", "co", "company", "corp",
+                  "corporation", "group", "holdings", "uk", "gmbh", "sa", "srl", "bv"}
+# Words many unrelated suppliers share; they say nothing about which company a name refers to
+GENERIC_TOKENS = {"and", "farm", "farms", "food", "foods", "fine", "fresh", "dairy", "dairies", "bakery", "bakers",
+                  "butcher", "butchers", "fish", "fishmongers", "meat", "meats", "produce", "market", "markets",
+                  "kitchen", "restaurant", "bar", "cafe", "wine", "wines", "merchants", "estate", "brewery", "coffee",
+                  "cheese", "organic", "supplies", "suppliers", "trading", "of", "london"}
+SIMILARITY_THRESHOLD = 0.88
+# Distinctive tokens shorter than this have to match exactly, since one letter turns Hill into Mill
+MIN_FUZZY_TOKEN_LENGTH = 6
+# Blocks bigger than this come from common tokens such as "farm" and are skipped; other keys still pair their names
+MAX_BLOCK_SIZE = 100
+PREFIX_LENGTH = 5
+
+
+def normalize_name(name):
+    """Folds accents, case, punctuation, "&" and legal suffixes: "Natoora Ltd." becomes "natoora"."""
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(char for char in name if not unicodedata.combining(char)).casefold()
+    name = name.replace("&", " and ").replace("'", "").replace("’", "")
+    tokens = re.sub(r'[^\w\s]|_', ' ', name).split()
+    while len(tokens) > 1 and tokens[-1] in LEGAL_SUFFIXES:
+        tokens.pop()
+    if len(tokens) > 1 and tokens[0] == "the":
+        tokens.pop(0)
+    return " ".join(tokens)
+
+
+def soundex(word):
+    """American Soundex code, used as a phonetic blocking key."""
+    codes = {**dict.fromkeys("bfpv", "1"), **dict.fromkeys("cgjkqsxz", "2"), **dict.fromkeys("dt", "3"),
+             "l": "4", **dict.fromkeys("mn", "5"), "r": "6"}
+    letters = [char for char in word if char.isalpha()]
+    if not letters:
+        return ""
+    encoded = letters[0].upper()
+    previous = codes.get(letters[0], "")
+    for char in letters[1:]:
+        code = codes.get(char, "")
+        if code and code != previous:
+            encoded += code
+        if char not in "hw":
+            previous = code
+    return (encoded + "000")[:4]
+
+
+def blocking_keys(normalized):
+    tokens = normalized.split()
+    keys = {f"prefix:{normalized.replace(' ', '')[:PREFIX_LENGTH]}", f"sound:{soundex(tokens[0])}"}
+    keys.update(f"token:{token}" for token in tokens if len(token) > 2)
+    return keys
+
+
+def distinctive_tokens(normalized):
+    tokens = normalized.split()
+    return [token for token in tokens if token not in GENERIC_TOKENS] or tokens
+
+
+def tokens_agree(a, b, threshold=SIMILARITY_THRESHOLD):
+    """
+    Every distinctive token of the name with fewer of them has to appear in the other name, either exactly (up to a
+    plural "s") or, for long tokens, as a near spelling with the same first three letters ("natoora" and "natora").
+    """
+    tokens_a, tokens_b = distinctive_tokens(a), distinctive_tokens(b)
+    if len(tokens_a) > len(tokens_b):
+        tokens_a, tokens_b = tokens_b, tokens_a
+    singulars_b = {token[:-1] if token.endswith("s") else token for token in tokens_b}
+    for token in tokens_a:
+        if (token[:-1] if token.endswith("s") else token) in singulars_b:
+            continue
+        if len(token) >= MIN_FUZZY_TOKEN_LENGTH and any(
+                len(other) >= MIN_FUZZY_TOKEN_LENGTH and other[:3] == token[:3]
+                and SequenceMatcher(None, token, other).ratio() >= threshold for other in tokens_b):
+            continue
+        return False
+    return True
+
+
+def similarity(a, b):
+    # A character-level ratio alone would merge "hill farm" and "mill farm", so the distinctive tokens must agree first
+    if not tokens_agree(a, b):
+        return 0.0
+    matcher = SequenceMatcher(None, a, b)
+    # The cheap upper bounds rule out most pairs before the full ratio is computed
+    if matcher.real_quick_ratio() < SIMILARITY_THRESHOLD or matcher.quick_ratio() < SIMILARITY_THRESHOLD:
+        return 0.0
+    return matcher.ratio()
+
+
+def resolve_names(names, threshold=SIMILARITY_THRESHOLD, max_block_size=MAX_BLOCK_SIZE, preferred=()):
+    """
+    Clusters name variants.
+    Takes an iterable of names (with repeats), or a {name: count} Counter, and returns {name: canonical name}.
+    The canonical name of a cluster is one of its preferred names if it has any (such as the names of nodes already
+    in the graph, which are also clustered), otherwise its most frequent spelling.
+    """
+    counts = Counter(names)
+    preferred = set(preferred)
+    for name in preferred:
+        counts.setdefault(name, 0)
+
+    # Exact matches after normalization need no comparison
+    variants_by_key = defaultdict(list)
+    for name in counts:
+        normalized = normalize_name(name)
+        if normalized:
+            variants_by_key[normalized].append(name)
+    keys = list(variants_by_key)
+
+    # Union-find over the normalized keys
+    parent = list(range(len(keys)))
+
+    def find(idx):
+        while parent[idx] != idx:
+            parent[idx] = parent[parent[idx]]
+            idx = parent[idx]
+        return idx
+
+    blocks = defaultdict(list)
+    for idx, key in enumerate(keys):
+        for block_key in blocking_keys(key):
+            blocks[block_key].append(idx)
+
+    for members in blocks.values():
+        if len(members) < 2 or len(members) > max_block_size:
+            continue
+        for i, first in enumerate(members):
+            for second in members[i + 1:]:
+                root_first, root_second = find(first), find(second)
+                if root_first != root_second and similarity(keys[first], keys[second]) >= threshold:
+                    parent[root_second] = root_first
+
+    clusters = defaultdict(list)
+    for idx, key in enumerate(keys):
+        clusters[find(idx)].extend(variants_by_key[key])
+
+    canonical = {}
+    for variants in clusters.values():
+        # A preferred name wins, then the most frequent spelling, then the first one seen
+        best = max(variants, key=lambda name: (name in preferred, counts[name]))
+        for name in variants:
+            canonical[name] = best
+    return canonical
+
+
+def aliases_from(canonical):
+    """Inverts {name: canonical name} into {canonical name: [other spellings]}."""
+    aliases = defaultdict(list)
+    for name, best in canonical.items():
+        if name != best:
+            aliases[best].append(name)
+    return dict(aliases)
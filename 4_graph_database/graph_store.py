@@ -0,0 +1,369 @@
+"""
+Graph stores behind the supply chain scripts.
+Neo4jGraphStore writes to and reads from Neo4j. InMemoryGraphStore keeps the same graph in adjacency lists, optionally
+saved to a JSON file, so the transform and the cluster/text generation can run and be benchmarked without a database.
+Both offer the operations the scripts use: merging nodes and relationships, listing edges and node tiers, fetching a
+cluster's relationships and looking up T2_Supplier -> Supplier -> Restaurant chains.
+"""
+
+import json
+import os
+import random
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from neo4j import GraphDatabase, basic_auth
+from neo4j.exceptions import TransientError
+
+# Load environment variables
+load_dotenv()
+
+# Neo set up
+DATABASE_URI = os.getenv("DATABASE_URI")
+NEO_USERNAME = os.getenv("NEO_USERNAME")
+NEO_PASSWORD = os.getenv("NEO_PASSWORD")
+# Use an in-memory graph saved to this JSON file instead of Neo4j
+GRAPH_FILE = os.getenv("GRAPH_FILE")
+
+# Rows sent per UNWIND statement, each batch in its own write transaction
+BATCH_SIZE = int(os.getenv("NEO4J_BATCH_SIZE", "1000"))
+# Sessions writing relationships concurrently
+WRITE_WORKERS = int(os.getenv("NEO4J_WRITE_WORKERS", "4"))
+MAX_DEADLOCK_RETRIES = 5
+
+DEFAULT_LABELS = ('Supplier', 'Restaurant', 'T2_Supplier')
+# Every node carries this label next to its tier label, so a node keeps its id and constraint when its tier changes
+ENTITY_LABEL = 'Entity'
+
+
+def open_graph_store(graph_file=GRAPH_FILE, batch_size=BATCH_SIZE, workers=WRITE_WORKERS):
+    """An in-memory store backed by graph_file when one is given, otherwise Neo4j from the environment."""
+    if graph_file:
+        return InMemoryGraphStore(graph_file)
+    return Neo4jGraphStore(DATABASE_URI, NEO_USERNAME, NEO_PASSWORD, batch_size, workers)
+
+
+def schema_name(label):
+    return 'buyer' if label == 'Restaurant' else label.lower()
+
+
+def node_query(label, previous_labels=()):
+    # Labels cannot be parameters, so there is one statement per label and the rows are sent as $rows
+    # Nodes already in the graph keep their name, so re-running or loading another file is idempotent
+    # The node is found by its id alone, and any tier label it had before is swapped for this one
+    stale_labels = "".join(f":{stale}" for stale in previous_labels if stale not in (label, ENTITY_LABEL))
+    return (
+        f"UNWIND $rows AS row MERGE (e:{ENTITY_LABEL} {{id: row.id}}) "
+        f"ON CREATE SET e.name = row.name, e.aliases = row.aliases "
+        f"ON MATCH SET e.aliases = [alias IN coalesce(e.aliases, []) WHERE NOT alias IN row.aliases] + row.aliases "
+        f"SET e.tier = row.tier "
+        + (f"REMOVE e{stale_labels} " if stale_labels else "")
+        + f"SET e:{label}"
+    )
+
+
+def relationship_query(rel_type):
+    # Matching on the entity label plus id lets both lookups use the id uniqueness constraint
+    return (
+        f"UNWIND $rows AS row "
+        f"MATCH (s:{ENTITY_LABEL} {{id: row.source_id}}) "
+        f"MATCH (b:{ENTITY_LABEL} {{id: row.target_id}}) "
+        f"MERGE (s)-[:{rel_type} {{product: row.product, location: row.location}}]->(b)"
+    )
+
+
+def batches(rows, batch_size):
+    # Rows are a table, and only the batch being sent is turned into parameter dicts
+    for start in range(0, len(rows), batch_size):
+        yield rows.iloc[start:start + batch_size].to_dict('records')
+
+
+def write_batch(session, query, batch):
+    """
+    Writes one batch in its own write transaction, retrying transient errors such as deadlocks.
+    execute_write already retries these for a while; this keeps going if that retry window runs out.
+    """
+    for attempt in range(MAX_DEADLOCK_RETRIES + 1):
+        try:
+            return session.execute_write(lambda tx: tx.run(query, rows=batch).consume())
+        except TransientError as e:
+            if attempt == MAX_DEADLOCK_RETRIES:
+                raise
+            delay = min(30, 2 ** attempt) * random.uniform(0.5, 1.5)
+            print(f"Transient error ({e.code}), retrying batch in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def write_batches(session, query, rows, batch_size):
+    # Each batch is one explicit write transaction, so the statement is planned once and reused
+    for batch in batches(rows, batch_size):
+        write_batch(session, query, batch)
+
+
+def partition_rows(rows, buckets):
+    """
+    Splits relationship rows into rounds of partitions that never share an endpoint node.
+    Nodes are hashed into `buckets` buckets (an even number), so a row touches at most two buckets.
+    The bucket pairs are scheduled like a round-robin tournament: in every round each bucket appears in exactly one
+    partition, so concurrent transactions in a round cannot lock the same node.
+    Returns a list of rounds, each a list of row tables.
+    """
+    source_buckets = pd.util.hash_array(rows['source_id'].to_numpy(dtype=object)) % buckets
+    target_buckets = pd.util.hash_array(rows['target_id'].to_numpy(dtype=object)) % buckets
+    low, high = np.minimum(source_buckets, target_buckets), np.maximum(source_buckets, target_buckets)
+    cells = {(int(first), int(second)): cell for (first, second), cell in rows.groupby([low, high])}
+
+    # A round for the rows inside a single bucket, then buckets - 1 rounds of disjoint bucket pairs
+    rounds = [[cells.get((bucket, bucket), rows.iloc[:0]) for bucket in range(buckets)]]
+    ring = list(range(buckets))
+    for _ in range(buckets - 1):
+        pairs = [tuple(sorted((ring[idx], ring[buckets - 1 - idx]))) for idx in range(buckets // 2)]
+        rounds.append([cells.get(pair, rows.iloc[:0]) for pair in pairs])
+        ring = [ring[0], ring[-1]] + ring[1:-1]
+    return [[partition for partition in round_ if len(partition)] for round_ in rounds]
+
+
+class Neo4jGraphStore:
+    """Neo4j through the official driver. Writes are batched UNWIND statements, relationships in parallel."""
+
+    def __init__(self, uri, username, password, batch_size=BATCH_SIZE, workers=WRITE_WORKERS):
+        self.driver = GraphDatabase.driver(uri, auth=basic_auth(username, password))
+        self.batch_size = batch_size
+        self.workers = workers
+
+    def clear(self):
+        with self.driver.session() as session:
+            session.run("MATCH (n) DETACH DELETE n")
+        print("Database cleared.")
+
+    def labels(self):
+        """The tier labels in the graph."""
+        with self.driver.session() as session:
+            return [record["label"] for record in session.run("CALL db.labels() YIELD label RETURN label")
+                    if record["label"] != ENTITY_LABEL]
+
+    def create_schema(self, labels=DEFAULT_LABELS):
+        queries = [f"CREATE CONSTRAINT entity_id_uniqueness IF NOT EXISTS FOR (n:{ENTITY_LABEL}) REQUIRE n.id IS UNIQUE;"]
+        for label in labels:
+            # Name lookups from the cluster extraction and the RAG chains
+            queries.append(f"CREATE INDEX {schema_name(label)}_name IF NOT EXISTS FOR (n:{label}) ON (n.name);")
+        with self.driver.session() as session:
+            for query in queries:
+                session.run(query)
+
+    def merge_nodes(self, label, rows):
+        """rows is a table of id, name, aliases and tier. Nodes already in the graph are moved to this label."""
+        with self.driver.session() as session:
+            write_batches(session, node_query(label, self.labels()), rows, self.batch_size)
+
+    def merge_relationships(self, rel_type, rows):
+        """rows is a table of source_id, target_id, product and location. Both endpoints must already exist."""
+        self.write_rows(relationship_query(rel_type), rows, parallel=self.workers > 1)
+
+    def write_rows(self, query, rows, parallel=False):
+        """Runs an UNWIND $rows statement over the table in batches, on a pool of sessions if parallel."""
+        if not parallel:
+            with self.driver.session() as session:
+                write_batches(session, query, rows, self.batch_size)
+            return
+
+        def write_partition(partition):
+            with self.driver.session() as session:
+                write_batches(session, query, partition, self.batch_size)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for partitions in partition_rows(rows, 2 * self.workers):
+                # Finish a round before starting the next, since partitions from different rounds can share nodes
+                list(executor.map(write_partition, partitions))
+
+    def node_tiers(self):
+        """Every node's id, name, aliases and tier, as a table."""
+        query = (f"MATCH (e:{ENTITY_LABEL}) "
+                 f"RETURN e.id AS id, e.name AS name, coalesce(e.aliases, []) AS aliases, e.tier AS tier")
+        with self.driver.session() as session:
+            return pd.DataFrame(session.run(query).data(), columns=['id', 'name', 'aliases', 'tier'])
+
+    def supply_edges(self):
+        """The supplier and buyer ids of every SUPPLIES relationship, as a table."""
+        query = (f"MATCH (s:{ENTITY_LABEL})-[:SUPPLIES]->(b:{ENTITY_LABEL}) "
+                 f"RETURN DISTINCT s.id AS source_id, b.id AS target_id")
+        with self.driver.session() as session:
+            return pd.DataFrame(session.run(query).data(), columns=['source_id', 'target_id'])
+
+    def edges(self, rel_type='SUPPLIES'):
+        query = f"""
+        MATCH (n)-[r:{rel_type}]->(m)
+        RETURN id(n) AS startNodeId, id(m) AS endNodeId
+        """
+        with self.driver.session() as session:
+            return session.run(query).data()
+
+    def cluster_relationships(self, cluster_nodes, rel_type='SUPPLIES'):
+        query = f"""
+        MATCH path = (n)-[r:{rel_type}]->(m)
+        WHERE id(n) IN $clusterNodes OR id(m) IN $clusterNodes
+        RETURN [label IN labels(n) WHERE label <> '{ENTITY_LABEL}'] AS StartNodeType, n.name AS StartNodeName,
+               r.product AS Product, r.location AS Location,
+               [label IN labels(m) WHERE label <> '{ENTITY_LABEL}'] AS EndNodeType, m.name AS EndNodeName
+        """
+        with self.driver.session() as session:
+            return session.run(query, clusterNodes=list(cluster_nodes)).data()
+
+    def tier_chains(self):
+        query = """
+        MATCH (t2:T2_Supplier)-[r1:SUPPLIES]->(s:Supplier)-[r2:SUPPLIES]->(rest:Restaurant)
+        RETURN t2.name AS T2SupplierName, r1.product AS T2Product, r1.location AS T2Location,
+               s.name AS SupplierName, r2.product AS Product, r2.location AS Location,
+               rest.name AS RestaurantName
+        """
+        with self.driver.session() as session:
+            return session.run(query).data()
+
+    def relationship_schema(self):
+        """Distinct (source label, type, target label) triples, e.g. for a Cypher query corrector."""
+        query = f"""
+        MATCH (n)-[r]->(m)
+        RETURN DISTINCT [label IN labels(n) WHERE label <> '{ENTITY_LABEL}'][0] AS source, type(r) AS type,
+               [label IN labels(m) WHERE label <> '{ENTITY_LABEL}'][0] AS target
+        """
+        with self.driver.session() as session:
+            return [(record["source"], record["type"], record["target"]) for record in session.run(query)]
+
+    def close(self):
+        self.driver.close()
+
+
+class InMemoryGraphStore:
+    """
+    The graph as adjacency lists of relationships out of and into every node, keyed by node id.
+    Merges follow the Neo4j statements: a node keeps its first name, gathers aliases and takes the label and tier of
+    its latest merge, relationships are unique per endpoints, type, product and location, and a relationship whose
+    endpoints are missing is skipped.
+    Given a path, the graph is loaded from it if it exists and saved back on close if anything was merged or cleared.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.nodes = {}
+        self.outgoing = defaultdict(dict)
+        self.incoming = defaultdict(dict)
+        self.changed = False
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def clear(self):
+        self.nodes.clear()
+        self.outgoing.clear()
+        self.incoming.clear()
+        self.changed = True
+        print("In-memory graph cleared.")
+
+    def labels(self):
+        return list(dict.fromkeys(node['label'] for node in self.nodes.values()))
+
+    def create_schema(self, labels=DEFAULT_LABELS):
+        # Nodes are already keyed by id
+        pass
+
+    def merge_nodes(self, label, rows):
+        self.changed = True
+        for node_id, name, aliases, tier in rows[['id', 'name', 'aliases', 'tier']].itertuples(index=False):
+            node = self.nodes.get(node_id)
+            if node is None:
+                self.nodes[node_id] = {'label': label, 'name': name, 'aliases': list(aliases), 'tier': int(tier)}
+            else:
+                node['aliases'] = [alias for alias in node['aliases'] if alias not in aliases] + list(aliases)
+                node['label'] = label
+                node['tier'] = int(tier)
+
+    def merge_relationships(self, rel_type, rows):
+        self.changed = True
+        columns = rows[['source_id', 'target_id', 'product', 'location']]
+        for source_id, target_id, product, location in columns.itertuples(index=False):
+            if source_id not in self.nodes or target_id not in self.nodes:
+                continue
+            # Dicts keep insertion order, so edges come back in the order they were merged
+            self.outgoing[source_id][(rel_type, target_id, product, location)] = None
+            self.incoming[target_id][(rel_type, source_id, product, location)] = None
+
+    def node_tiers(self):
+        return pd.DataFrame([(node_id, node['name'], node.get('aliases', []), node['tier'])
+                             for node_id, node in self.nodes.items()],
+                            columns=['id', 'name', 'aliases', 'tier'])
+
+    def supply_edges(self):
+        return pd.DataFrame(list(dict.fromkeys((source_id, target_id) for source_id, relationships in self.outgoing.items()
+                                               for type_, target_id, _, _ in relationships if type_ == 'SUPPLIES')),
+                            columns=['source_id', 'target_id'])
+
+    def edges(self, rel_type='SUPPLIES'):
+        return [{'startNodeId': source_id, 'endNodeId': target_id}
+                for source_id, relationships in self.outgoing.items()
+                for type_, target_id, _, _ in relationships if type_ == rel_type]
+
+    def _record(self, source_id, product, location, target_id):
+        source, target = self.nodes[source_id], self.nodes[target_id]
+        return {'StartNodeType': [source['label']], 'StartNodeName': source['name'],
+                'Product': product, 'Location': location,
+                'EndNodeType': [target['label']], 'EndNodeName': target['name']}
+
+    def cluster_relationships(self, cluster_nodes, rel_type='SUPPLIES'):
+        cluster_nodes = set(cluster_nodes)
+        records = []
+        for node_id in cluster_nodes:
+            for type_, target_id, product, location in self.outgoing.get(node_id, ()):
+                if type_ == rel_type:
+                    records.append(self._record(node_id, product, location, target_id))
+            for type_, source_id, product, location in self.incoming.get(node_id, ()):
+                # Relationships between two cluster nodes were already listed from their source
+                if type_ == rel_type and source_id not in cluster_nodes:
+                    records.append(self._record(source_id, product, location, node_id))
+        return records
+
+    def _supplies(self, node_id, label):
+        for type_, target_id, product, location in self.outgoing.get(node_id, ()):
+            if type_ == 'SUPPLIES' and self.nodes[target_id]['label'] == label:
+                yield target_id, product, location
+
+    def tier_chains(self):
+        records = []
+        for t2_id, t2 in self.nodes.items():
+            if t2['label'] != 'T2_Supplier':
+                continue
+            for supplier_id, t2_product, t2_location in self._supplies(t2_id, 'Supplier'):
+                for restaurant_id, product, location in self._supplies(supplier_id, 'Restaurant'):
+                    records.append({'T2SupplierName': t2['name'], 'T2Product': t2_product, 'T2Location': t2_location,
+                                    'SupplierName': self.nodes[supplier_id]['name'], 'Product': product,
+                                    'Location': location, 'RestaurantName': self.nodes[restaurant_id]['name']})
+        return records
+
+    def relationship_schema(self):
+        return list(dict.fromkeys((self.nodes[source_id]['label'], type_, self.nodes[target_id]['label'])
+                                  for source_id, relationships in self.outgoing.items()
+                                  for type_, target_id, _, _ in relationships))
+
+    def load(self, path):
+        with open(path, encoding='utf-8') as f:
+            graph = json.load(f)
+        self.nodes = {node.pop('id'): node for node in graph['nodes']}
+        for source_id, rel_type, target_id, product, location in graph['relationships']:
+            self.outgoing[source_id][(rel_type, target_id, product, location)] = None
+            self.incoming[target_id][(rel_type, source_id, product, location)] = None
+
+    def save(self, path):
+        graph = {
+            'nodes': [{'id': node_id, **node} for node_id, node in self.nodes.items()],
+            'relationships': [[source_id, rel_type, target_id, product, location]
+                              for source_id, relationships in self.outgoing.items()
+                              for rel_type, target_id, product, location in relationships],
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(graph, f)
+        print(f"Graph saved to {path}")
+
+    def close(self):
+        if self.path and self.changed:
+            self.save(self.path)
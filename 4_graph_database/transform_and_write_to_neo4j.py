@@ -5,188 +5,421 @@ There are a number of careful and complex data transformations performed.
 """
 
 # Import libraries
+import gzip
+import hashlib
+import io
+import itertools
 import json
 import os
+import re
+import unicodedata
+from collections import Counter
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
 from dotenv import load_dotenv
-from neo4j import GraphDatabase, basic_auth
 from google.cloud import storage
 import argparse
+from entity_resolution import resolve_names, aliases_from
+from bulk_export import export_graph, PART_SIZE
+from graph_store import open_graph_store, BATCH_SIZE, WRITE_WORKERS, GRAPH_FILE, DEFAULT_LABELS, ENTITY_LABEL
 
 # Load environment variables
 load_dotenv()
 
-# Neo set up
-DATABASE_URI = os.getenv("DATABASE_URI")
-NEO_USERNAME = os.getenv("NEO_USERNAME")
-NEO_PASSWORD = os.getenv("NEO_PASSWORD")
-
-# Connect to Neo4j
-driver = GraphDatabase.driver(DATABASE_URI, auth=basic_auth(NEO_USERNAME, NEO_PASSWORD))
+# Columns of the relationship table
+TABLE_COLUMNS = ['supplier', 'buyer', 'product', 'location']
 
 # Google Cloud Storage Configurations
 PROJECT_ID = os.getenv("PROJECT_ID")
 BUCKET_NAME = os.getenv("BUCKET_NAME")
 
-# Initialize Google Cloud Storage Client
-storage_client = storage.Client()
-bucket = storage_client.bucket(BUCKET_NAME)
 
-def clear_database():
-    query = "MATCH (n) DETACH DELETE n"
-    with driver.session() as session:
-        session.run(query)
-    print("Database cleared.")
+def open_input(file_path):
+    # Local files are read directly, so offline runs need no Google Cloud credentials
+    if os.path.exists(file_path):
+        return open(file_path, "rb")
+    return storage.Client().bucket(BUCKET_NAME).blob(file_path).open("rb")
+
+def iter_json_array(stream, buffer="", chunk_size=1 << 20):
+    """
+    Yields the items of a JSON array read from a text stream, decoding one item at a time.
+    buffer holds any text already read from the start of the stream.
+    Items are decoded in place from an offset into the buffer, which is only trimmed when more of the stream is read.
+    """
+    decoder = json.JSONDecoder()
+    separators = re.compile(r'[\s,]*')
+    buffer = (buffer + stream.read(chunk_size)).lstrip()
+    if not buffer.startswith("["):
+        raise ValueError("Expected a JSON array")
+    position = 1
+    eof = False
+    while True:
+        position = separators.match(buffer, position).end()
+        if buffer.startswith("]", position):
+            return
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            # The item continues past the buffer, so read more of the file and try again
+            if eof:
+                raise
+            chunk = stream.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        yield item
+
 
 def read_json_from_gcs(file_path):
-    blob = bucket.blob(file_path)
-    data = blob.download_as_text(encoding='utf-8')
-    return json.loads(data)
+    """
+    Yields the relationships of each article stored in a GCS (or local) file, as {'relationships': [...]}.
+    Accepts a JSON list or JSONL with one article per line (as written by the KFP pipeline), optionally gzipped.
+    Both are parsed one article at a time as the file downloads, and article text is dropped straight away,
+    so memory depends on the number of relationships rather than the size of the file.
+    """
+    with open_input(file_path) as raw:
+        compressed = raw.read(2) == b"\x1f\x8b"
+        raw.seek(0)
+        stream = io.TextIOWrapper(gzip.GzipFile(fileobj=raw) if compressed else raw, encoding='utf-8')
+        # Sniff the first non-blank character, since a compact JSON array is a single line as long as the file
+        first_char = stream.read(1)
+        while first_char.isspace():
+            first_char = stream.read(1)
+        if first_char == "[":
+            articles = iter_json_array(stream, first_char)
+        else:
+            lines = itertools.chain([first_char + stream.readline()], stream)
+            articles = (json.loads(line) for line in lines if line.strip())
+        for article in articles:
+            yield {'relationships': article.get('relationships') or []}
+
+def relationship_table(articles, chunk_size=100_000):
+    """
+    Flattens a stream of articles into one columnar table with a row per relationship.
+    Columns are supplier, buyer, product and location, all dictionary encoded (categorical), so each distinct name
+    is stored once. Rows are encoded in chunks as they stream in, so the raw strings are never all held at once.
+    """
+    chunks = []
+    relationships = []
+
+    def encode_column(column):
+        # factorize keeps first-seen order, which avoids the sort pd.Categorical does on its categories
+        codes, uniques = pd.factorize(np.array([relationship.get(column) or '' for relationship in relationships],
+                                               dtype=object))
+        return pd.Categorical.from_codes(codes, uniques)
+
+    def encode_chunk():
+        if relationships:
+            chunks.append(pd.DataFrame({column: encode_column(column) for column in TABLE_COLUMNS}))
+        relationships.clear()
+
+    for article in articles:
+        relationships.extend(article['relationships'])
+        if len(relationships) >= chunk_size:
+            encode_chunk()
+    encode_chunk()
 
-def filter_banned_entities(data):
+    if not chunks:
+        return pd.DataFrame({column: pd.Categorical([]) for column in TABLE_COLUMNS})
+    return pd.DataFrame({column: union_categoricals([chunk[column] for chunk in chunks], ignore_order=True)
+                         for column in TABLE_COLUMNS})
+
+
+def filter_banned_entities(table):
     """
     Filters out relationships that include any of the banned entities
     either as a Supplier or a Buyer.
     """
     banned_entities = ["Restaurants", "Customers", "Michelin Guide"]
-    filtered_data = []
-    for item in data:
-        new_relationships = [r for r in item['relationships']
-                             if r['supplier'] not in banned_entities
-                             and r['buyer'] not in banned_entities]
-        if new_relationships:
-            item['relationships'] = new_relationships
-            filtered_data.append(item)
-    return filtered_data
-
-
-def preprocess_data(data):
-    """
-    Preprocess the data to identify and update second-order relationships.
-    Changes 'supplier' to 'T2_supplier' and 'buyer' to 'supplier' where applicable.
-    """
-    # Identify entities that are both suppliers and buyers
-    data = filter_banned_entities(data)
-    suppliers = set()
-    buyers = set()
-    for item in data:
-        for relationship in item['relationships']:
-            suppliers.add(relationship['supplier'])
-            buyers.add(relationship['buyer'])
-    second_order_entities = suppliers.intersection(buyers)
-    print(second_order_entities)
-
-    # Update the relationships accordingly
-    for item in data:
-        for relationship in item['relationships']:
-            if relationship['buyer'] in second_order_entities:
-                relationship['T2_supplier'] = relationship.pop('supplier')
-                relationship['supplier'] = relationship.pop('buyer')
-    return data
-
-def create_and_execute_schema_queries():
-    queries = [
-        "CREATE CONSTRAINT supplier_id_uniqueness IF NOT EXISTS FOR (s:Supplier) REQUIRE s.id IS UNIQUE;",
-        "CREATE CONSTRAINT buyer_id_uniqueness IF NOT EXISTS FOR (r:Restaurant) REQUIRE r.id IS UNIQUE;",
-        "CREATE CONSTRAINT t2_supplier_id_uniqueness IF NOT EXISTS FOR (t:T2_Supplier) REQUIRE t.id IS UNIQUE;"
-    ]
-    with driver.session() as session:
-        for query in queries:
-            session.run(query)
-
-def remove_apostrophes(value):
-    """Removes apostrophes from a string."""
-    return value.replace("'", "")
-
-
-def create_cypher_queries(data):
-    # Track existing entities to avoid duplicate IDs
-    existing_entities = {'Supplier': {}, 'Restaurant': {}, 'T2_Supplier': {}}   # Restaurant // Buyer
-
-    queries = []
-    for item in data:
-        for relationship in item['relationships']:
-            # Determine entity types and handle missing 'buyer' key by checking for 'T2_supplier'
-            entities = {}
-            if 'supplier' in relationship:
-                entities['supplier'] = 'Supplier'
-            if 'buyer' in relationship:
-                entities['buyer'] = 'Restaurant'    # Restaurant // Buyer
-            if 'T2_supplier' in relationship:
-                entities['T2_supplier'] = 'T2_Supplier'
-
-            # Prepare the data, removing apostrophes
-            for role, entity in entities.items():
-                name_key = role  # 'supplier', 'buyer', or 'T2_supplier'
-                name = remove_apostrophes(relationship[name_key])
-                if name not in existing_entities[entity]:
-                    entity_id = f"{name_key[:3].lower()}_{len(existing_entities[entity]) + 1}"
-                    existing_entities[entity][name] = entity_id
-                    query_entity = f"MERGE (e:{entity} {{id: '{entity_id}', name: '{name}'}})"
-                    queries.append(query_entity)
-
-            # Adjust relationship query based on available entities
-            if 'T2_supplier' in entities and 'supplier' in entities:
-                supplier_id = existing_entities['T2_Supplier'][remove_apostrophes(relationship['T2_supplier'])]
-                buyer_id = existing_entities['Supplier'][remove_apostrophes(relationship['supplier'])]
-                rel_type = 'SUPPLIES'
-            elif 'supplier' in entities and 'buyer' in entities:
-                supplier_id = existing_entities['Supplier'][remove_apostrophes(relationship['supplier'])]
-                buyer_id = existing_entities['Restaurant'][remove_apostrophes(relationship['buyer'])]  # Restaurant // Buyer
-                rel_type = 'SUPPLIES'
-            else:
-                continue  # Skip if the required entities for a relationship are not present
-
-            product = remove_apostrophes(relationship.get('product', ''))
-            location = remove_apostrophes(relationship.get('location', ''))
-            query_rel = (
-                f"MATCH (s {{id: '{supplier_id}'}}), "
-                f"(b {{id: '{buyer_id}'}}) "
-                f"MERGE (s)-[:{rel_type} {{product: '{product}', location: '{location}'}}]->(b)"
-            )
-            queries.append(query_rel)
-
-    return queries
-
-def execute_queries(queries):
-    with driver.session() as session:
-        for query in queries:
-            session.run(query)
-
-def main(file_path):
-    # Clear database while testing to reset
-    # clear_database()
-
-    # Load data
-    data = read_json_from_gcs(file_path)
-
-    # Preprocess data here
-    data = preprocess_data(data)
-
-    # Create schema in Neo4j first
-    create_and_execute_schema_queries()
-
-    # Process data to generate Cypher queries
-    queries = create_cypher_queries(data)
-
-    # Execute Cypher queries to populate the Neo4j database
-    execute_queries(queries)
-
-    print("All data successfully imported into Neo4j.")
-
-    # Close the Neo4j driver connection
-    driver.close()
+    keep = ~table['supplier'].isin(banned_entities) & ~table['buyer'].isin(banned_entities)
+    # Empty names cannot be nodes
+    keep &= (table['supplier'] != '') & (table['buyer'] != '')
+    return table[keep].reset_index(drop=True)
+
+
+def resolve_entity_names(table, existing_nodes=None):
+    """
+    Merges spellings of the same entity across the supplier and buyer columns.
+    Only the distinct names are resolved, and the columns are remapped category by category.
+    In upsert mode existing_nodes (id, name, aliases, tier) holds the nodes already loaded. Their names and aliases are
+    resolved together with the file's, and a spelling that matches an existing node takes that node's name, so a new
+    variant joins the node rather than starting a second one.
+    Returns the new table and {canonical name: [other spellings]}.
+    """
+    # Counting per category avoids materialising a string per row
+    counts = table['supplier'].value_counts().add(table['buyer'].value_counts(), fill_value=0)
+    counts = Counter({name: int(count) for name, count in counts.items() if count})
+    # Aliases of existing nodes are resolved too, and stand for the node they belong to
+    node_names, alias_owner = [], {}
+    if existing_nodes is not None:
+        node_names = existing_nodes['name'].dropna().tolist()
+        for name, node_aliases in zip(existing_nodes['name'].tolist(), existing_nodes['aliases'].tolist()):
+            for alias in node_aliases if isinstance(node_aliases, list) else []:
+                alias_owner.setdefault(alias, name)
+    candidates = Counter(counts)
+    for alias in alias_owner:
+        candidates.setdefault(alias, 0)
+    resolved = resolve_names(candidates, preferred=node_names)
+    canonical = {name: alias_owner.get(resolved[name], resolved[name]) for name in counts if name in resolved}
+    table = table.copy()
+    for column in ('supplier', 'buyer'):
+        table[column] = table[column].map(lambda name: canonical.get(name, name)).astype('category')
+    aliases = aliases_from(canonical)
+    print(f"Entity resolution merged {sum(len(names) for names in aliases.values())} name variants "
+          f"into {len(aliases)} entities")
+    return table, aliases
+
+
+def supply_tiers(suppliers, buyers, node_count):
+    """
+    Works out every node's tier from supplier -> buyer pairs of integer node codes.
+    Restaurants are buyers that never supply anyone (tier 0). Every other node's tier is its shortest distance in
+    SUPPLIES steps to a restaurant: direct suppliers are tier 1, their suppliers tier 2, and so on.
+    The breadth-first search runs from all restaurants at once, one frontier at a time.
+    Each relationship is scanned once, when its buyer joins the frontier, so this is linear in the number of
+    relationships, and cycles are walked only once. Nodes with no path to a restaurant are treated as tier 1.
+    """
+    is_supplier = np.zeros(node_count, dtype=bool)
+    is_supplier[suppliers] = True
+    tiers = np.full(node_count, -1, dtype=np.int64)
+    tiers[np.unique(buyers)] = 0
+    tiers[is_supplier] = -1
+
+    # Suppliers of each buyer as a CSR adjacency list
+    order = np.argsort(buyers, kind='stable')
+    suppliers_by_buyer = suppliers[order]
+    degree = np.bincount(buyers, minlength=node_count)
+    starts = np.concatenate([[0], np.cumsum(degree)[:-1]])
+
+    frontier = np.flatnonzero(tiers == 0)
+    level = 0
+    while frontier.size:
+        lengths = degree[frontier]
+        total = lengths.sum()
+        if not total:
+            break
+        # Positions of every frontier buyer's suppliers, gathered without a Python loop
+        offsets = np.repeat(starts[frontier] - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+        candidates = np.unique(suppliers_by_buyer[offsets + np.arange(total)])
+        frontier = candidates[tiers[candidates] == -1]
+        level += 1
+        tiers[frontier] = level
+    tiers[tiers == -1] = 1
+    return tiers
+
+
+def preprocess_data(table, existing_nodes=None, existing_edges=None):
+    """
+    Builds the supply graph once and works out every entity's tier with supply_tiers.
+    Nodes are keyed by entity_id, so spellings with the same normalized form are one node.
+    In upsert mode existing_nodes (id, name, tier) and existing_edges (source_id, target_id) hold the graph already
+    loaded. It is tiered together with the new relationships, so an entity gets the same tier whichever file it came
+    from, and existing nodes whose tier changes are written again with their new tier.
+    Identical relationships are dropped. The input table is not modified.
+    Returns (nodes table of id, name, tier and the spellings of the node in this file, for every node to write,
+             edges table of source_id, target_id, product, location, source_tier and target_tier).
+    """
+    table = table.drop_duplicates(ignore_index=True)
+    # Re-encode both name columns against one shared dictionary of entities, working on codes rather than strings
+    supplier_column = table['supplier'].cat.remove_unused_categories()
+    buyer_column = table['buyer'].cat.remove_unused_categories()
+    entities = supplier_column.cat.categories.union(buyer_column.cat.categories)
+    suppliers = supplier_column.cat.set_categories(entities).cat.codes.to_numpy(dtype=np.int64)
+    buyers = buyer_column.cat.set_categories(entities).cat.codes.to_numpy(dtype=np.int64)
+    entity_names = entities.to_numpy(dtype=object)
+    entity_ids = np.array([entity_id(name) for name in entity_names], dtype=object)
+
+    if existing_nodes is None:
+        existing_nodes = pd.DataFrame({'id': [], 'name': [], 'tier': []})
+    if existing_edges is None:
+        existing_edges = pd.DataFrame({'source_id': [], 'target_id': []})
+
+    # One code per node, existing nodes first so a node already in the graph keeps its stored name
+    all_names = np.concatenate([existing_nodes['name'].to_numpy(dtype=object), entity_names])
+    node_codes, node_ids = pd.factorize(np.concatenate([existing_nodes['id'].to_numpy(dtype=object), entity_ids]))
+    node_ids = pd.Index(node_ids)
+    existing_codes, entity_codes = node_codes[:len(existing_nodes)], node_codes[len(existing_nodes):]
+    names = all_names[np.unique(node_codes, return_index=True)[1]]
+
+    # Edges already in the graph, then the ones from this file
+    sources = np.concatenate([node_ids.get_indexer(existing_edges['source_id']), entity_codes[suppliers]])
+    targets = np.concatenate([node_ids.get_indexer(existing_edges['target_id']), entity_codes[buyers]])
+    known = (sources >= 0) & (targets >= 0)
+    tiers = supply_tiers(sources[known], targets[known], len(node_ids))
+
+    # Nodes named in this file, and existing nodes that moved to another tier
+    in_file = np.zeros(len(node_ids), dtype=bool)
+    in_file[entity_codes] = True
+    stored_tiers = np.full(len(node_ids), -1, dtype=np.int64)
+    stored_tiers[existing_codes] = pd.to_numeric(existing_nodes['tier'], errors='coerce').fillna(-1).to_numpy()
+    write = in_file | (tiers != stored_tiers)
+    spellings = [[] for _ in range(len(node_ids))]
+    for code, name in zip(entity_codes.tolist(), entity_names):
+        spellings[code].append(name)
+
+    write_codes = np.flatnonzero(write)
+    nodes = pd.DataFrame({'id': node_ids.to_numpy(dtype=object)[write_codes], 'name': names[write_codes],
+                          'tier': tiers[write_codes], 'spellings': [spellings[code] for code in write_codes]})
+    supplier_nodes, buyer_nodes = entity_codes[suppliers], entity_codes[buyers]
+    edges = pd.DataFrame({'source_id': node_ids.to_numpy(dtype=object)[supplier_nodes],
+                          'target_id': node_ids.to_numpy(dtype=object)[buyer_nodes],
+                          'product': table['product'], 'location': table['location'],
+                          'source_tier': tiers[supplier_nodes], 'target_tier': tiers[buyer_nodes]})
+    # Spellings that normalize alike can still repeat a relationship
+    edges = edges.drop_duplicates(['source_id', 'target_id', 'product', 'location'], ignore_index=True)
+
+    tier_values, tier_counts = np.unique(tiers, return_counts=True)
+    print(f"Entities per tier: {dict(zip(tier_values.tolist(), tier_counts.tolist()))}")
+    retiered = int((write & ~in_file).sum())
+    if retiered:
+        print(f"{retiered} nodes already in the graph move to another tier")
+    return nodes, edges
+
+
+def tier_label(tier):
+    # Tier 0 and 1 keep the labels the RAG chains and cluster extraction already query
+    if tier == 0:
+        return 'Restaurant'
+    if tier == 1:
+        return 'Supplier'
+    return f'T{tier}_Supplier'
+
+
+def normalize_entity_name(name):
+    """Folds Unicode forms, case and whitespace so trivially different spellings share an ID."""
+    return re.sub(r'\s+', ' ', unicodedata.normalize("NFKC", name)).strip().casefold()
+
+
+def entity_id(name):
+    """
+    Deterministic node ID from the normalized name only.
+    The same entity gets the same ID in every file and every run, whatever its tier, so loads can be merged into an
+    existing graph. The tier and its label are node properties that a later load can change.
+    """
+    digest = hashlib.sha1(normalize_entity_name(name).encode('utf-8')).hexdigest()[:16]
+    return f"ent_{digest}"
+
+
+def create_graph_rows(nodes, edges, aliases=None):
+    """
+    Groups the rows to write by label, straight from the tiered tables.
+    aliases maps a canonical entity name to the other spellings merged into it by entity resolution. A node's aliases
+    are those of its spellings in this file, plus any spelling that differs from the node's name.
+    Returns nodes as {label: table of id, name, aliases, tier} and relationships as
+    {(source label, type, target label): table of source_id, target_id, product, location}.
+    """
+    aliases = aliases or {}
+    max_tier = int(max([0, *nodes['tier'], *edges['source_tier'].unique(), *edges['target_tier'].unique()]))
+    tier_labels = np.array([tier_label(tier) for tier in range(max_tier + 1)], dtype=object)
+
+    node_aliases = [list(dict.fromkeys(alias for spelling in spellings
+                                       for alias in [spelling] + aliases.get(spelling, []) if alias != name))
+                    for name, spellings in zip(nodes['name'].tolist(), nodes['spellings'].tolist())]
+    node_table = pd.DataFrame({'id': nodes['id'], 'name': nodes['name'], 'aliases': node_aliases,
+                               'tier': nodes['tier'], 'label': tier_labels[nodes['tier'].to_numpy(dtype=np.int64)]})
+    nodes = {label: rows.drop(columns='label').reset_index(drop=True)
+             for label, rows in node_table.groupby('label', sort=False)}
+
+    edge_table = edges[['source_id', 'target_id', 'product', 'location']]
+    # Group on the integer tiers of both endpoints rather than on label strings
+    relationships = {(tier_labels[source_tier], 'SUPPLIES', tier_labels[target_tier]): rows.reset_index(drop=True)
+                     for (source_tier, target_tier), rows in edge_table.groupby([edges['source_tier'],
+                                                                                 edges['target_tier']])}
+    return nodes, relationships
+
+
+def write_graph(store, nodes, relationships):
+    # Nodes first, so every relationship batch can match both of its endpoints
+    for label, rows in nodes.items():
+        store.merge_nodes(label, rows)
+        print(f"Wrote {len(rows)} {label} nodes")
+    for (source_label, rel_type, target_label), rows in relationships.items():
+        store.merge_relationships(rel_type, rows)
+        print(f"Wrote {len(rows)} {source_label}-{rel_type}->{target_label} relationships")
+
+def main(file_path, batch_size=BATCH_SIZE, mode="upsert", bulk_export_dir=None, part_size=PART_SIZE,
+         workers=WRITE_WORKERS, graph_file=GRAPH_FILE):
+    # Load data into a columnar relationship table
+    table = relationship_table(read_json_from_gcs(file_path))
+    table = filter_banned_entities(table)
+
+    existing_nodes = existing_edges = None
+    if not bulk_export_dir:
+        # Neo4j, or an in-memory graph kept in graph_file
+        store = open_graph_store(graph_file, batch_size, workers)
+        # IDs are deterministic, so by default the file is merged into the existing graph.
+        # A rebuild wipes the graph first, for when the whole graph should come from this file.
+        if mode == "rebuild":
+            store.clear()
+        else:
+            # Tiers depend on the whole graph, so the file is tiered together with what is already loaded
+            existing_nodes, existing_edges = store.node_tiers(), store.supply_edges()
+
+    # Merge spellings of the same entity before tiering, so all variants are tiered together
+    table, aliases = resolve_entity_names(table, existing_nodes)
+
+    # Work out each entity's tier in the supply chain
+    nodes, edges = preprocess_data(table, existing_nodes, existing_edges)
+
+    # Group nodes by label and relationships by type into tables of rows
+    nodes, relationships = create_graph_rows(nodes, edges, aliases)
+
+    if bulk_export_dir:
+        # Full rebuild with the offline importer instead of online writes
+        command = export_graph(nodes, relationships, bulk_export_dir, part_size, base_label=ENTITY_LABEL)
+        print(f"Bulk import files written to {bulk_export_dir}. With the database stopped, run:\n{command}")
+        print("Then start the database and run this script with --schema_only to create the constraints and indexes.")
+        return
+
+    # Create schema first
+    store.create_schema(list(nodes))
+
+    # Write the rows in batches
+    write_graph(store, nodes, relationships)
+
+    print("All data successfully imported into the graph.")
+
+    # Close the Neo4j driver connection, or save the in-memory graph
+    store.close()
 
 
 if __name__ == "__main__":
     # Create the parser
     parser = argparse.ArgumentParser(description='Process a file from Google Cloud Storage.')
     # Add an argument
-    parser.add_argument('file_path', type=str, help='The GCS file path to process')
+    parser.add_argument('file_path', type=str, nargs='?', help='The GCS file path to process')
+    parser.add_argument('--batch_size', type=int, default=BATCH_SIZE, help='Rows written per transaction')
+    parser.add_argument('--workers', type=int, default=WRITE_WORKERS,
+                        help='Sessions writing relationships concurrently')
+    parser.add_argument('--mode', choices=['upsert', 'rebuild'], default='upsert',
+                        help='Merge the file into the existing graph, or clear the database and rebuild from it')
+    parser.add_argument('--bulk-export', dest='bulk_export', type=str, default=None, metavar='DIR',
+                        help='Write neo4j-admin import CSVs to this directory instead of writing to the database')
+    parser.add_argument('--part_size', type=int, default=PART_SIZE, help='Rows per bulk export CSV part')
+    parser.add_argument('--schema_only', action='store_true',
+                        help='Only create the constraints and indexes, e.g. after a bulk import')
+    parser.add_argument('--graph_file', type=str, default=GRAPH_FILE,
+                        help='Write to an in-memory graph saved to this JSON file instead of Neo4j')
     # Parse the argument
     args = parser.parse_args()
-    # Now use this file_path in the main function
-    main(args.file_path)
+    if args.schema_only:
+        schema_store = open_graph_store(args.graph_file)
+        schema_store.create_schema(schema_store.labels() or DEFAULT_LABELS)
+        schema_store.close()
+    elif args.file_path:
+        # Now use this file_path in the main function
+        main(args.file_path, args.batch_size, args.mode, args.bulk_export, args.part_size, args.workers,
+             args.graph_file)
+    else:
+        parser.error("file_path is required unless --schema_only is given")
 
 # To run this script now - where we can change the inputted file path
 # python transform_and_write_to_neo4j.py "processed_output/restaurant_supply_chain_relationships.json"
-
+# Later extraction files can be loaded on their own, as deltas merged into the same graph
+# python transform_and_write_to_neo4j.py "processed_output/new_articles.jsonl" --mode upsert
+# Offline, from a local file into an in-memory graph that get_relevant_clusters.py can read with the same flag
+# python transform_and_write_to_neo4j.py restaurant_supply_chain_relationships.jsonl --graph_file graph.json
+# A full rebuild through neo4j-admin
+# python transform_and_write_to_neo4j.py "processed_output/restaurant_supply_chain_relationships.json" --bulk-export import/
@@ -4,39 +4,28 @@ Then, concise statements are generated from it and saved to GCS.
 These textual representations of the clusters are what will be inserted into Pinecone.
 """
 
-from neo4j import GraphDatabase
 import os
+import sys
 from dotenv import load_dotenv
 from collections import defaultdict
 from google.cloud import storage
 import json
 import argparse
 
+# graph_store.py sits with the graph loader, in 4_graph_database/ in the repo and graph_database/ in the image
+sys.path.extend(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', folder)
+                for folder in ('4_graph_database', 'graph_database'))
+from graph_store import open_graph_store, GRAPH_FILE
+
 # Load environment variables
 load_dotenv()
 
-DATABASE_URI = os.getenv("DATABASE_URI")
-NEO_USERNAME = os.getenv("NEO_USERNAME")
-NEO_PASSWORD = os.getenv("NEO_PASSWORD")
-
-driver = GraphDatabase.driver(DATABASE_URI, auth=(NEO_USERNAME, NEO_PASSWORD))
-
 # Google Cloud Storage Configurations
 PROJECT_ID = os.getenv("PROJECT_ID")
 BUCKET_NAME = os.getenv("BUCKET_NAME")
 
-# Initialize Google Cloud Storage Client
-storage_client = storage.Client()
-bucket = storage_client.bucket(BUCKET_NAME)
-
-def fetch_nodes_and_relationships():
-    query = """
-    MATCH (n)-[r:SUPPLIES]->(m)
-    RETURN id(n) AS startNodeId, id(m) AS endNodeId
-    """
-    with driver.session() as session:
-        result = session.run(query)
-        return result.data()
+def fetch_nodes_and_relationships(store):
+    return store.edges('SUPPLIES')
 
 
 def find_clusters(data):
@@ -64,79 +53,75 @@ def find_clusters(data):
     return clusters
 
 
-def generate_textual_representation(cluster_nodes):
-    query = """
-    MATCH path = (n)-[r:SUPPLIES]->(m)
-    WHERE id(n) IN $clusterNodes OR id(m) IN $clusterNodes
-    RETURN labels(n) AS StartNodeType, n.name AS StartNodeName, 
-           r.product AS Product, r.location AS Location,
-           labels(m) AS EndNodeType, m.name AS EndNodeName
-    """
+def generate_textual_representation(store, cluster_nodes):
     textual_representations = []
-    with driver.session() as session:
-        result = session.run(query, clusterNodes=list(cluster_nodes))
-        for record in result:
-            text = (f"A {record['StartNodeType'][0]} named {record['StartNodeName']} "
-                    f"supplies {record['Product']} in the location {record['Location']} "
-                    f"to a {record['EndNodeType'][0]} named {record['EndNodeName']}.")
-            textual_representations.append(text)
+    for record in store.cluster_relationships(cluster_nodes, 'SUPPLIES'):
+        text = (f"A {record['StartNodeType'][0]} named {record['StartNodeName']} "
+                f"supplies {record['Product']} in the location {record['Location']} "
+                f"to a {record['EndNodeType'][0]} named {record['EndNodeName']}.")
+        textual_representations.append(text)
     return textual_representations
 
 
-def generate_complete_supply_chain_text():
-    query = """
-    MATCH (t2:T2_Supplier)-[r1:SUPPLIES]->(s:Supplier)-[r2:SUPPLIES]->(rest:Restaurant)
-    RETURN t2.name AS T2SupplierName, r1.product AS T2Product, r1.location AS T2Location, 
-           s.name AS SupplierName, r2.product AS Product, r2.location AS Location, 
-           rest.name AS RestaurantName
-    """
+def generate_complete_supply_chain_text(store):
     chain_representations = []
-    with driver.session() as session:
-        result = session.run(query)
-        for record in result:
-            text = (
-                f"A T2_Supplier named {record['T2SupplierName']} supplies {record['T2Product']} in the location {record['T2Location']} "
-                f"to a Supplier named {record['SupplierName']}, this Supplier named {record['SupplierName']} then supplies "
-                f"{record['Product']} in the location {record['Location']} to a Restaurant named {record['RestaurantName']}.")
-            chain_representations.append(text)
+    for record in store.tier_chains():
+        text = (
+            f"A T2_Supplier named {record['T2SupplierName']} supplies {record['T2Product']} in the location {record['T2Location']} "
+            f"to a Supplier named {record['SupplierName']}, this Supplier named {record['SupplierName']} then supplies "
+            f"{record['Product']} in the location {record['Location']} to a Restaurant named {record['RestaurantName']}.")
+        chain_representations.append(text)
 
     return chain_representations
 
 def save_text_to_cloud_storage(text_data, file_name):
+    bucket = storage.Client().bucket(BUCKET_NAME)
     blob = bucket.blob(f"vector_database_resources/textual_representations/{file_name}")
     blob.upload_from_string(text_data, content_type='text/plain')
     print(f"Text data saved to {BUCKET_NAME}/vector_database_resources/textual_representations/{file_name}")
 
+def save_text_to_file(text_data, output_dir, file_name):
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, file_name)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text_data)
+    print(f"Text data saved to {path}")
+
 # Main execution flow
-def main(output_file_name):  # Accept the output_file_name parameter
-    data = fetch_nodes_and_relationships()
+def main(output_file_name, graph_file=GRAPH_FILE, output_dir=None):  # Accept the output_file_name parameter
+    # Neo4j, or an in-memory graph written by transform_and_write_to_neo4j.py --graph_file
+    store = open_graph_store(graph_file)
+    data = fetch_nodes_and_relationships(store)
     clusters = find_clusters(data)
     # all_cluster_nodes = set().union(*clusters)
 
-    all_texts = ""
+    all_texts = []
 
     for cluster_nodes in clusters:
-        textual_representations = generate_textual_representation(cluster_nodes)
-        for text in textual_representations:
-            all_texts += text + "\n"
+        all_texts.extend(generate_textual_representation(store, cluster_nodes))
 
-    chain_representations = generate_complete_supply_chain_text()
-    for text in chain_representations:
-        all_texts += text + "\n"
+    all_texts.extend(generate_complete_supply_chain_text(store))
+    all_texts = "".join(text + "\n" for text in all_texts)
 
     # Use the output_file_name for saving the text data
-    save_text_to_cloud_storage(all_texts, output_file_name)
+    if output_dir:
+        save_text_to_file(all_texts, output_dir, output_file_name)
+    else:
+        save_text_to_cloud_storage(all_texts, output_file_name)
 
-    driver.close()
+    store.close()
 
 if __name__ == "__main__":
     # Setup argparse
     parser = argparse.ArgumentParser(description='Generate textual representations from Neo4j and save to GCS.')
     parser.add_argument('output_file_name', type=str, help='The name of the output file to save data to')
+    parser.add_argument('--graph_file', type=str, default=GRAPH_FILE,
+                        help='Read an in-memory graph from this JSON file instead of Neo4j')
+    parser.add_argument('--output_dir', type=str, default=None, help='Save the text to this local directory instead of GCS')
     args = parser.parse_args()
 
     # Call main with the output file name
-    main(args.output_file_name)
-
-
+    main(args.output_file_name, args.graph_file, args.output_dir)
 
+# To run offline on a graph saved by transform_and_write_to_neo4j.py --graph_file graph.json
+# python get_relevant_clusters.py neo4j_textual_representations.txt --graph_file graph.json --output_dir output/
@@ -30,12 +30,21 @@ openai_api_key = os.getenv("OPENAI_API_KEY")
 # driver = GraphDatabase.driver(DATABASE_URI, auth=basic_auth(NEO_USERNAME, NEO_PASSWORD))
 graph = Neo4jGraph(url=DATABASE_URI, username=NEO_USERNAME, password=NEO_PASSWORD)
 
-corrector_schema = [
-    # Assuming 'Supplier' nodes can supply to 'Restaurant' nodes
-    Schema("Supplier", "SUPPLIES", "Restaurant"),
-    # Assuming 'T2_Supplier' nodes can supply to 'Supplier' nodes
-    Schema("T2_Supplier", "SUPPLIES", "Supplier")
-]
+# Relationship directions are read from the graph, which also has Supplier -> Supplier and deeper tier relationships.
+# Every node also carries the Entity base label, so the tier label is the one that is not Entity
+schema_query = """
+MATCH (n)-[r]->(m)
+RETURN DISTINCT [label IN labels(n) WHERE label <> 'Entity'][0] AS source, type(r) AS type,
+       [label IN labels(m) WHERE label <> 'Entity'][0] AS target
+"""
+corrector_schema = [Schema(record["source"], record["type"], record["target"]) for record in graph.query(schema_query)]
+if not corrector_schema:
+    corrector_schema = [
+        # Assuming 'Supplier' nodes can supply to 'Restaurant' nodes
+        Schema("Supplier", "SUPPLIES", "Restaurant"),
+        # Assuming 'T2_Supplier' nodes can supply to 'Supplier' nodes
+        Schema("T2_Supplier", "SUPPLIES", "Supplier")
+    ]
 cypher_validation = CypherQueryCorrector(corrector_schema)
 
 # Step 4: LLMs